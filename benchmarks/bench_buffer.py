@@ -0,0 +1,56 @@
+"""
+Microbenchmark of buffer append/evict and peek/commit costs at different capacities. The ring buffer is compared with
+the former list-backed implementation (append + del buffer[0] on overflow).
+
+Usage (from the repository root):
+    python -m benchmarks.bench_buffer [number of operations]
+"""
+import sys
+import time
+from src.Buffer import Buffer
+
+CAPACITIES = [10000, 100000, 1000000]
+
+
+def make_cfg(capacity):
+    return {'buffer': {'max_size': capacity}, 'event_logger': {'publish': False, 'print_level': 'ERR'}}
+
+
+def bench_ring_append(capacity, n_ops):
+    buffer = Buffer(make_cfg(capacity))
+    buffer._lanes[0].store.entities.extend([None] * capacity)
+    start_time = time.perf_counter()
+    for i in range(n_ops):
+        buffer.append(i)
+    return (time.perf_counter() - start_time) / n_ops
+
+
+def bench_ring_peek_commit(capacity, n_ops, batch_size=500):
+    buffer = Buffer(make_cfg(capacity))
+    buffer._lanes[0].store.entities.extend([None] * capacity)
+    start_time = time.perf_counter()
+    for _ in range(n_ops):
+        seq, batch = buffer.peek_batch(batch_size)
+        buffer.commit(len(batch), seq)
+        buffer._lanes[0].store.entities.extend(batch)
+    return (time.perf_counter() - start_time) / n_ops
+
+
+def bench_list_append(capacity, n_ops):
+    legacy = [None] * capacity
+    start_time = time.perf_counter()
+    for i in range(n_ops):
+        if len(legacy) + 1 > capacity:
+            del legacy[0]
+        legacy.append(i)
+    return (time.perf_counter() - start_time) / n_ops
+
+
+if __name__ == '__main__':
+    n_ops = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print('%10s %18s %18s %24s' % ('capacity', 'ring append [us]', 'list append [us]', 'peek+commit 500 [us]'))
+    for capacity in CAPACITIES:
+        print('%10d %18.3f %18.3f %24.3f' % (capacity,
+                                              bench_ring_append(capacity, n_ops) * 1e6,
+                                              bench_list_append(capacity, n_ops) * 1e6,
+                                              bench_ring_peek_commit(capacity, n_ops // 100) * 1e6))
@@ -0,0 +1,133 @@
+"""
+Benchmark of per-point and batched ingestion into a local stand-in INFLUXDB HTTP server.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_influxdb_batching [number of points]
+"""
+import gzip
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.Buffer import Buffer, BufferEntity
+from src.event_logger import log_event
+from src.influxdb_writer import InfluxDBWriter
+
+
+class StandInInfluxDBHandler(BaseHTTPRequestHandler):
+    """
+    Minimal INFLUXDB 1.x API: answers ping, query and write requests without storing anything. The server counts
+    connections, requests, received bytes (request line, headers and body) and written points.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections = getattr(self.server, 'connections', 0) + 1
+
+    def _account(self, body_length):
+        self.server.requests = getattr(self.server, 'requests', 0) + 1
+        self.server.bytes_received = getattr(self.server, 'bytes_received', 0) + \
+            len(self.requestline) + 2 + len(str(self.headers)) + body_length
+
+    def _reply(self, code, body=b''):
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('X-Influxdb-Version', '1.8-stand-in')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._account(0)
+        if self.path.startswith('/ping'):
+            self._reply(204)
+        else:
+            self._reply(200, b'{"results": [{"statement_id": 0, "series": [{"name": "databases", '
+                             b'"columns": ["name"], "values": [["bench"]]}]}]}')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        self._account(length)
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        if self.path.startswith('/write'):
+            self.server.points_received += len(body.splitlines())
+            self._reply(204)
+        else:
+            self._reply(200, b'{"results": [{"statement_id": 0}]}')
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_cfg(port):
+    return {
+        'influxdb': {'host': '127.0.0.1', 'port': port, 'user': 'root', 'password': 'root', 'database': 'bench',
+                     'db_user': '', 'db_password': '', 'reconnect_interval': 1000, 'write_interval': 1000,
+                     'batch_size': 500, 'batch_max_bytes': 65536},
+        'buffer': {'max_size': 1000000},
+        'event_logger': {'publish': False, 'print_level': 'ERR'},
+    }
+
+
+def fill_buffer(buffer, n_points):
+    timestamp = round(time.time() * 1000)
+    for i in range(n_points):
+        buffer.add_point(BufferEntity(
+            {'measurement': 'voltage',
+             'tags': {'Unit': 'V', 'SclMin': 40, 'SclMax': 60},
+             'fields': {'Value': 50 + (i % 100) / 10},
+             'timestamp': timestamp + i}
+        ))
+
+
+def write_point(writer, data_line):
+    """
+    Former ingestion path, which wrote every point within its own request
+    """
+    try:
+        writer.client.write([data_line], database=writer.db_name, precision='ms')
+        log_event(writer.cfg, writer.module_name, '', 'INFO', 'Line >%s< inserted in influxdb', data_line)
+        return True
+    except Exception as err:
+        log_event(writer.cfg, writer.module_name, '', 'WARN', 'Data insertion failed: %s', err)
+        return False
+
+
+def bench_per_point(writer, n_points):
+    fill_buffer(writer.buffer, n_points)
+    start_time = time.perf_counter()
+    while writer.buffer.len():
+        seq, buffer_entities = writer.buffer.peek_batch(1, writer.consumer)
+        _, data_line = buffer_entities[0].convert_to_line_protocol()
+        if write_point(writer, data_line):
+            writer.buffer.commit(1, seq, writer.consumer)
+    return time.perf_counter() - start_time
+
+
+def bench_batched(writer, n_points):
+    fill_buffer(writer.buffer, n_points)
+    start_time = time.perf_counter()
+    writer._ingest_cycle()
+    return time.perf_counter() - start_time
+
+
+if __name__ == '__main__':
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInInfluxDBHandler)
+    server.points_received = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cfg = make_cfg(server.server_address[1])
+
+    for name, bench in [('per-point', bench_per_point), ('batched', bench_batched)]:
+        writer = InfluxDBWriter(cfg=cfg, buffer=Buffer(cfg))
+        server.points_received = 0
+        duration = bench(writer, n_points)
+        print('%-10s %7d points in %7.3f s -> %10.0f points/s (received %d, left in buffer %d)'
+              % (name, n_points, duration, n_points / duration, server.points_received, writer.buffer.len()))
+        writer.client.close()
+
+    server.shutdown()
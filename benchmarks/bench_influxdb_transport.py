@@ -0,0 +1,85 @@
+"""
+Comparison of the former INFLUXDB transport (InfluxDBClient, ping every 0.5 s, uncompressed payloads) with the pooled
+keep-alive transport (gzip payloads, health checks piggybacking on writes). A writer operating for the given number of
+minutes is replayed against a local stand-in server: points are produced at a constant rate and written every
+max_latency, the connectivity check runs every 0.5 s. The transport is replayed by the writer itself on a simulated
+clock. Connections, requests and bytes on the wire are counted by the server.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_influxdb_transport [minutes] [points per second]
+"""
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from influxdb import InfluxDBClient
+from benchmarks.bench_influxdb_batching import StandInInfluxDBHandler, make_cfg
+from src.Buffer import Buffer
+from src.clock import SimulatedClock
+from src.influxdb_writer import InfluxDBWriter
+from src.point import Point, registry
+
+CHECK_INTERVAL = 0.5
+MAX_LATENCY = 10.0
+HEALTH_CHECK_INTERVAL = 10.0
+
+
+def make_batches(minutes, rate):
+    series = registry.register('voltage', {'Unit': 'V', 'SclMin': 40, 'SclMax': 60})
+    timestamp = round(time.time() * 1000)
+    points_per_batch = round(rate * MAX_LATENCY)
+    n_batches = round(minutes * 60 / MAX_LATENCY)
+    return [[Point(series, timestamp + round((b * points_per_batch + i) * 1000 / rate),
+                   (50 + ((b * points_per_batch + i) % 100) / 10,))
+             for i in range(points_per_batch)] for b in range(n_batches)]
+
+
+def replay_legacy(port, batches):
+    client = InfluxDBClient(host='127.0.0.1', port=port, database='bench')
+    ticks_per_batch = round(MAX_LATENCY / CHECK_INTERVAL)
+    for batch in batches:
+        for _ in range(ticks_per_batch):
+            client.ping()
+        client.write_points([point.convert_to_line_protocol()[1] for point in batch], database='bench',
+                            time_precision='ms', protocol='line')
+    client.close()
+
+
+def replay_transport(port, batches):
+    cfg = make_cfg(port)
+    cfg['influxdb']['health_check_interval'] = HEALTH_CHECK_INTERVAL * 1000
+    clock = SimulatedClock()
+    buffer = Buffer(cfg)
+    writer = InfluxDBWriter(cfg=cfg, buffer=buffer, clock=clock)
+
+    # The first connectivity step connects and starts the ingestion worker, which is stopped again: the replay runs
+    # the ingestion cycles itself every max_latency of simulated time
+    writer._connectivity_step()
+    writer._stop_ingestion()
+    writer._ingestion_thread.join()
+
+    ticks_per_batch = round(MAX_LATENCY / CHECK_INTERVAL)
+    for batch in batches:
+        for point in batch:
+            buffer.append(point)
+        for _ in range(ticks_per_batch):
+            clock.advance(CHECK_INTERVAL)
+            writer._connectivity_step()
+        writer._ingest_cycle()
+    writer.disconnect()
+
+
+if __name__ == '__main__':
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 12
+
+    batches = make_batches(minutes, rate)
+    for name, replay in [('legacy', replay_legacy), ('pooled+gzip', replay_transport)]:
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StandInInfluxDBHandler)
+        server.points_received = server.connections = server.requests = server.bytes_received = 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        replay(server.server_address[1], batches)
+        server.shutdown()
+        print('%-12s %6d points, %4d connection(s), %6.1f requests/min, %9.0f bytes/min on the wire'
+              % (name, server.points_received, server.connections, server.requests / minutes,
+                 server.bytes_received / minutes))
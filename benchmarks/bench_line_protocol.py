@@ -0,0 +1,72 @@
+"""
+Benchmark of the line protocol encoder against the former string concatenation in BufferEntity.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_line_protocol [number of points]
+"""
+import sys
+import time
+from src.Buffer import BufferEntity
+from src.line_protocol import encoder
+from src.point import Point
+
+
+def legacy_convert_to_line_protocol(data):
+    """
+    Former implementation of BufferEntity.convert_to_line_protocol
+    """
+    data_line = data['measurement']
+    if 'tags' in data:
+        for key, value in data['tags'].items():
+            if isinstance(value, (int, float)):
+                data_line += ',' + key + '=' + str(value)
+            else:
+                value = value.replace(' ', '')
+                data_line += ',' + key + '=' + value
+    data_line += ' '
+    for key, value in data['fields'].items():
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            data_line += key + '=' + str(value) + ','
+        else:
+            value = value.replace(' ', '')
+            data_line += key + '="' + value + '",'
+    data_line = data_line[:-1]
+    data_line += ' ' + str(data['timestamp'])
+    return data_line
+
+
+def make_points(n_points):
+    timestamp = round(time.time() * 1000)
+    points = []
+    for i in range(n_points):
+        if i % 2:
+            points.append(BufferEntity(
+                {'measurement': 'voltage',
+                 'tags': {'Unit': 'V', 'SclMin': 40, 'SclMax': 60},
+                 'fields': {'Value': 50 + (i % 100) / 10},
+                 'timestamp': timestamp + i}))
+        else:
+            points.append(BufferEntity(
+                {'measurement': 'outputs',
+                 'fields': {'Output%02d' % (channel + 1): bool((i >> channel) & 1) for channel in range(13)},
+                 'timestamp': timestamp + i}))
+    return points
+
+
+def bench(name, function, n_points):
+    start_time = time.perf_counter()
+    function()
+    duration = time.perf_counter() - start_time
+    print('%-28s %8.3f s -> %10.0f points/s' % (name, duration, n_points / duration))
+
+
+if __name__ == '__main__':
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    points = make_points(n_points)
+    bench('legacy concatenation', lambda: [legacy_convert_to_line_protocol(p.data) for p in points], n_points)
+    bench('encoder, point by point', lambda: [encoder.encode(p.data) for p in points], n_points)
+    bench('encoder, bulk payload', lambda: encoder.encode_batch(points), n_points)
+    compact_points = [Point.from_dict(p.data) for p in points]
+    bench('Point, bulk payload', lambda: encoder.encode_batch(compact_points), n_points)
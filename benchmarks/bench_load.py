@@ -0,0 +1,91 @@
+"""
+Load test of the acquisition -> pipeline -> buffer -> writer path: many virtual edge nodes with the simulated HAL
+backend run in one process and write into a local stand-in INFLUXDB HTTP server.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_load [number of nodes] [duration in s] [voltage rate in Hz] [raw]
+
+With 'raw', aggregation and deadband filtering are disabled, so that every sample is written.
+"""
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+import yaml
+from benchmarks.bench_influxdb_batching import StandInInfluxDBHandler
+from src.Buffer import Buffer
+from src.edge_node import EdgeNode
+from src.influxdb_writer import InfluxDBWriter
+from src.pipeline import PipelineStage, build_pipeline
+
+
+class CountingStage(PipelineStage):
+    """
+    Stage counting the acquired points
+    """
+
+    def __init__(self, sink):
+        super().__init__(sink)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add_point(self, point):
+        with self._lock:
+            self.count += 1
+        self.sink.add_point(point)
+
+
+def make_cfg(port, voltage_rate, raw):
+    with open('config.yaml') as config_file:
+        cfg = yaml.safe_load(config_file)
+    cfg['influxdb'].update({'host': '127.0.0.1', 'port': port, 'database': 'bench', 'db_user': '', 'db_password': '',
+                            'reconnect_interval': 1000, 'max_latency': 1000})
+    cfg['buffer'] = {'max_size': 1000000}
+    cfg['event_logger'] = {'publish': False, 'print_level': 'ERR'}
+    cfg['sampling']['voltage_rate'] = voltage_rate
+    cfg['simulation'].update({'active': True, 'profile': 'sine'})
+    cfg['hal'] = {'backend': 'simulated'}
+    if raw:
+        cfg['aggregation'] = {}
+        cfg['deadband'] = {}
+    return cfg
+
+
+if __name__ == '__main__':
+    n_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    voltage_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    raw = len(sys.argv) > 4 and sys.argv[4] == 'raw'
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInInfluxDBHandler)
+    server.points_received = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cfg = make_cfg(server.server_address[1], voltage_rate, raw)
+
+    buffer = Buffer(cfg)
+    pipeline = CountingStage(build_pipeline(cfg, buffer))
+    idb = InfluxDBWriter(cfg=cfg, buffer=buffer)
+    nodes = [EdgeNode(cfg=cfg, buffer=pipeline) for _ in range(n_nodes)]
+    idb.connect()
+
+    start_time = time.perf_counter()
+    for node in nodes:
+        node.start()
+    time.sleep(duration)
+    for node in nodes:
+        node.stop()
+    elapsed = time.perf_counter() - start_time
+
+    # Wait until the writer has drained the buffer
+    deadline = time.monotonic() + 10
+    while buffer.len() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    idb.exit()
+    server.shutdown()
+
+    overruns = sum(statistics['overruns'] for node in nodes
+                   for statistics in node.get_sampling_statistics().values())
+    print('%d nodes, %.1f s: acquired %d points (%.0f points/s), written %d points (%.0f points/s), '
+          'left in buffer %d, overruns %d'
+          % (n_nodes, elapsed, pipeline.count, pipeline.count / elapsed, server.points_received,
+             server.points_received / elapsed, buffer.len(), overruns))
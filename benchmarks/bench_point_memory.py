@@ -0,0 +1,59 @@
+"""
+Memory footprint of buffered data points: dict-based BufferEntity compared with the compact Point. Points are generated
+in the proportion of the edge node data collection (phase, voltage and outputs every second).
+
+Usage (from the repository root):
+    python -m benchmarks.bench_point_memory [number of points]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+from src.Buffer import BufferEntity
+from src.point import Point, registry
+
+OUTPUT_KEYS = tuple('Output%02d' % (i + 1) for i in range(13))
+
+
+def make_buffer_entity(i, timestamp):
+    if i % 3 == 0:
+        return BufferEntity({'measurement': 'phase', 'fields': {'Value': 2}, 'timestamp': timestamp})
+    if i % 3 == 1:
+        return BufferEntity({'measurement': 'voltage',
+                             'tags': {'Unit': 'V', 'SclMin': 40, 'SclMax': 60},
+                             'fields': {'Value': 50 + (i % 100) / 10},
+                             'timestamp': timestamp})
+    return BufferEntity({'measurement': 'outputs',
+                         'fields': {key: bool((i >> channel) & 1) for channel, key in enumerate(OUTPUT_KEYS)},
+                         'timestamp': timestamp})
+
+
+def make_point(i, timestamp, series):
+    if i % 3 == 0:
+        return Point(series[0], timestamp, (2,))
+    if i % 3 == 1:
+        return Point(series[1], timestamp, (50 + (i % 100) / 10,))
+    return Point(series[2], timestamp, tuple(bool((i >> channel) & 1) for channel in range(13)))
+
+
+def measure(factory, n_points):
+    gc.collect()
+    tracemalloc.start()
+    base_timestamp = round(time.time() * 1000)
+    before = tracemalloc.get_traced_memory()[0]
+    points = [factory(i, base_timestamp + i) for i in range(n_points)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del points
+    return used
+
+
+if __name__ == '__main__':
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    series = (registry.register('phase'),
+              registry.register('voltage', {'Unit': 'V', 'SclMin': 40, 'SclMax': 60}),
+              registry.register('outputs', None, OUTPUT_KEYS))
+    for name, factory in [('BufferEntity (dict)', make_buffer_entity),
+                          ('Point (__slots__)', lambda i, timestamp: make_point(i, timestamp, series))]:
+        used = measure(factory, n_points)
+        print('%-20s %7d points: %8.1f MiB, %6.1f bytes/point' % (name, n_points, used / 2 ** 20, used / n_points))
@@ -0,0 +1,111 @@
+"""
+Benchmark suite based on pytest-benchmark: control step latency, line protocol encoding, buffer operations and the
+end-to-end pipeline from acquisition to the encoded write batch. The file is not collected by the default test run.
+
+Usage (from the repository root, requires pytest-benchmark):
+    python -m pytest benchmarks/bench_suite.py
+"""
+import time
+import pytest
+import yaml
+from src.Buffer import Buffer
+from src.clock import SimulatedClock
+from src.influxdb_writer import InfluxDBWriter
+from src.input_simulator import InputSimulator
+from src.line_protocol import LineProtocolEncoder
+from src.pipeline import build_pipeline
+from src.point import Point, registry
+from src.replay import ControllerReplay
+
+N_POINTS = 10000
+
+
+@pytest.fixture(scope='module')
+def cfg():
+    with open('config.yaml') as config_file:
+        cfg = yaml.safe_load(config_file)
+    cfg['event_logger'] = {'publish': False, 'print_level': 'ERR'}
+    cfg['buffer'] = {'max_size': 1000000}
+    cfg['simulation']['active'] = True
+    cfg['hal'] = {'backend': 'simulated'}
+    return cfg
+
+
+@pytest.fixture(scope='module')
+def points():
+    series = registry.register('voltage', {'Unit': 'V', 'SclMin': 40, 'SclMax': 60})
+    timestamp = round(time.time() * 1000)
+    return [Point(series, timestamp + i, (50 + (i % 100) / 10,)) for i in range(N_POINTS)]
+
+
+def test_control_step(benchmark, cfg):
+    trace = InputSimulator(55, 'random_walk', seed=0).generate(100000)
+    replay = ControllerReplay(cfg, trace)
+    node = replay.node
+    for _ in range(node.voltage_statistics.size):
+        node._data_collection_step_voltage_input()
+
+    def control_step():
+        node._data_collection_step_voltage_input()
+        node._control_step()
+
+    benchmark(control_step)
+
+
+def test_controller_replay_hour(benchmark, cfg):
+    trace = InputSimulator(55, 'random_walk', seed=0).generate(36000)
+    benchmark.pedantic(lambda: ControllerReplay(cfg, trace).run(3600), rounds=3)
+
+
+def test_encode_batch(benchmark, points):
+    lines = benchmark(LineProtocolEncoder.encode_batch, points)
+    assert lines.count(b'\n') == N_POINTS
+
+
+def test_buffer_append(benchmark, cfg, points):
+    def append():
+        buffer = Buffer(cfg)
+        for point in points:
+            buffer.append(point)
+        return buffer
+
+    assert benchmark(append).len() == N_POINTS
+
+
+def test_buffer_peek_commit(benchmark, cfg, points):
+    def drain(buffer):
+        while buffer.len():
+            seq, entities = buffer.peek_batch(500)
+            buffer.commit(len(entities), seq)
+
+    def setup():
+        buffer = Buffer(cfg)
+        for point in points:
+            buffer.append(point)
+        return (buffer,), {}
+
+    benchmark.pedantic(drain, setup=setup, rounds=20)
+
+
+def test_pipeline_end_to_end(benchmark, cfg):
+    voltage = InputSimulator(55, 'random_walk', seed=0).generate(N_POINTS)
+
+    def acquire_and_encode():
+        clock = SimulatedClock()
+        buffer = Buffer(cfg)
+        pipeline = build_pipeline(cfg, buffer)
+        writer = InfluxDBWriter(cfg=cfg, buffer=buffer)
+        series = registry.register(cfg['influxdb']['voltage_measurement_name'], {'Unit': 'V'})
+        for value in voltage:
+            clock.advance(0.1)
+            pipeline.add_point(Point(series, round(clock.time() * 1000), (float(value),)))
+        pipeline.flush()
+        encoded = 0
+        while buffer.len():
+            seq, entities = buffer.peek_batch(writer.batch_size, writer.consumer)
+            consumed, lines = writer._prepare_batch(entities)
+            encoded += len(lines)
+            buffer.commit(consumed, seq, writer.consumer)
+        return encoded
+
+    assert benchmark(acquire_and_encode) > 0
@@ -1,7 +1,9 @@
-from src.influxdb_writer import InfluxDBWriter
+from src.influxdb_writer import create_writers
 from src.Buffer import Buffer
+from src.pipeline import build_pipeline
 from src.edge_node import EdgeNode
 from src.frontend import Frontend
+from src.async_runtime import AsyncRuntime
 import yaml
 
 if __name__ == '__main__':
@@ -11,15 +13,25 @@ if __name__ == '__main__':
     with open(cfg_file) as config_file:
         cfg = yaml.safe_load(config_file)
 
-    # Initialise buffer
+    # Initialise buffer and replay points, which have not been ingested before the last shutdown
     data_buffer = Buffer(cfg)
+    data_buffer.restore()
 
-    # Start influxdb writer
-    idb = InfluxDBWriter(cfg=cfg, buffer=data_buffer)
-    idb.connect()
+    # Initialise influxdb writers (server and mirrors, each with an own cursor over the buffer) and controller
+    writers = create_writers(cfg, data_buffer)
+    idb = writers[0]
+    # Collected data points pass the processing pipeline (aggregation) before entering the buffer
+    pipeline = build_pipeline(cfg, data_buffer)
+    ctrl = EdgeNode(cfg=cfg, buffer=pipeline)
 
-    # Start controller
-    ctrl = EdgeNode(cfg=cfg, buffer=data_buffer)
+    # In asyncio mode, the controller and the writer of the server are driven by a single event loop instead of own
+    # threads, mirrors keep own threads
+    if cfg.get('runtime', {}).get('mode', 'threads') == 'asyncio':
+        AsyncRuntime(cfg, ctrl, idb)
+
+    # Start influxdb writers and controller
+    for writer in writers:
+        writer.connect()
     ctrl.start()
 
     # Start frontend
@@ -1,4 +1,11 @@
+import os
+import threading
+from collections import deque
+from itertools import islice
 from src.event_logger import log_event
+from src.line_protocol import encoder
+from src.metrics import metrics_registry
+from src.spool import Spool, SpooledEntity
 
 
 class BufferEntity:
@@ -14,59 +21,287 @@ class BufferEntity:
         This function converts received data into influxdb line protocol
         :return:
         """
-
         try:
-            # Measurement
-            data_line = self.data['measurement']
-
-            # Tags
-            if 'tags' in self.data:
-                for key, value in self.data['tags'].items():
-                    if isinstance(value, (int, float)):
-                        data_line += ',' + key + '=' + str(value)
-                    else:
-                        value = value.replace(' ', '')
-                        data_line += ',' + key + '=' + value
-
-            # Backspace between tags and fields
-            data_line += ' '
-
-            # Fields
-            for key, value in self.data['fields'].items():
-                if isinstance(value, bool):
-                    value = int(value)
-                if isinstance(value, (int, float)):
-                    data_line += key + '=' + str(value) + ','
-                else:
-                    value = value.replace(' ', '')
-                    data_line += key + '="' + value + '",'
+            return [True, encoder.encode(self.data)]
+        except Exception as err:
+            return [False, err]
 
-            # Removing last comma
-            data_line = data_line[:-1]
 
-            # Adding timestamp
-            data_line += ' ' + str(self.data['timestamp'])
+class RingStore:
+    """
+    In-memory storage of the buffer: a fixed-capacity ring, which drops the oldest entity on overflow
+    """
 
-            return [True, data_line]
+    def __init__(self, max_size):
+        """
+        Initialisation
+        :param max_size: capacity of the ring
+        """
+        self.max_size = max_size
+        self.entities = deque()
+        self.head_seq = 0
 
-        except Exception as err:
-            return [False, err]
+    def __len__(self):
+        return len(self.entities)
+
+    def append(self, buffer_entity):
+        """
+        This function appends an entity to the ring
+        :param buffer_entity: buffer entity
+        :return: number of dropped entities
+        """
+        dropped = 0
+        if len(self.entities) == self.max_size:
+            self.entities.popleft()
+            self.head_seq += 1
+            dropped = 1
+        self.entities.append(buffer_entity)
+        return dropped
+
+    def full(self):
+        """
+        This function checks whether the ring reached its capacity
+        :return:
+        """
+        return len(self.entities) >= self.max_size
+
+    def read(self, n, offset=0):
+        """
+        This function returns up to n entities starting from the given offset after the oldest one
+        :param n: maximal number of entities
+        :param offset: number of entities to skip
+        :return: list of entities
+        """
+        return list(islice(self.entities, offset, offset + n))
+
+    def release(self, n):
+        """
+        This function drops n oldest entities
+        :param n: number of entities
+        :return: number of dropped entities
+        """
+        n = min(n, len(self.entities))
+        for _ in range(n):
+            self.entities.popleft()
+        self.head_seq += n
+        return n
+
+    def discard(self, idx):
+        """
+        This function removes entities at given positions. Sequence numbers of the following entities are shifted, so
+        the buffer does not discard entities as long as consumer cursors refer to them.
+        :param idx: set of indices
+        :return:
+        """
+        self.entities = deque(buffer_entity for i, buffer_entity in enumerate(self.entities) if i not in idx)
+
+
+class _Lane:
+    """
+    Priority class of the buffer with its own storage, eviction policy and consumer cursors
+    """
+
+    __slots__ = ('name', 'store', 'eviction', 'cursors', 'dropped', 'evicted_counter', 'rejected_counter')
+
+    def __init__(self, name, store, eviction):
+        self.name = name
+        self.store = store
+        self.eviction = eviction
+        # Read cursors of registered consumers: sequence number of the next entity to be processed
+        self.cursors = {}
+        # Number of entities dropped due to overflow
+        self.dropped = 0
+
+        # Metrics: the size is computed at collection time, drops are counted as evictions of the oldest entities or
+        # rejections of incoming ones according to the eviction policy
+        labels = {'lane': name}
+        metrics_registry.gauge('buffer_size', 'Number of points in the buffer lane', labels) \
+            .set_function(lambda: len(self.store))
+        self.evicted_counter = metrics_registry.counter('buffer_evicted_total',
+                                                        'Oldest points evicted from the full buffer lane', labels)
+        self.rejected_counter = metrics_registry.counter('buffer_rejected_total',
+                                                         'Incoming points rejected by the full buffer lane', labels)
+
+    def pending(self, consumer=None):
+        """
+        This function returns the number of entities not yet committed by a consumer
+        :param consumer: consumer name, None - all entities of the lane
+        :return:
+        """
+        if consumer is None:
+            return len(self.store)
+        return self.store.head_seq + len(self.store) - max(self.cursors[consumer], self.store.head_seq)
+
+    def reclaim(self):
+        """
+        This function releases entities committed by all consumers
+        :return: number of released entities
+        """
+        if not self.cursors:
+            return 0
+        return self.store.release(max(min(self.cursors.values()) - self.store.head_seq, 0))
 
 
 class Buffer:
     """
-    Buffer class plays role a temporary FIFO storage for data points before ingestion into influx db
+    Buffer class plays role a temporary FIFO storage for data points before ingestion into influx db. Points are
+    sorted by their measurement into priority lanes. Each lane keeps its entities either in a fixed-capacity ring in
+    memory or, if a spool directory is configured, in a disk-backed spool of encoded lines, and has its own eviction
+    policy: when a lane is full, either its oldest entities or the incoming ones are dropped. Consumers read the lanes
+    in the order of their priority. Every entity gets a sequence number within its lane, so that consumers can peek a
+    batch, write it and commit it afterwards, even if some of the peeked entities have been dropped in the meantime.
+    Registered consumers read the buffer with independent cursors, an entity is released after all of them have
+    committed it.
     """
 
+    EVICTION_POLICIES = ('drop_oldest', 'drop_newest')
+
     def __init__(self, cfg):
         """
         Initialisation
-        :param cfg: Set of parameters including maximal buffer size and text output parameters
+        :param cfg: Set of parameters including maximal buffer size, priority lanes and text output parameters
         """
         self.module_name = 'Buffer'
         self.cfg = cfg
         self.max_buffer_size = self.cfg['buffer']['max_size']
-        self.buffer = []
+        self.spooled = bool(self.cfg['buffer'].get('spool_dir'))
+
+        # Priority lanes, the first lane is drained first. Points of measurements not assigned to any lane go into
+        # the lane without measurements, or into the last one.
+        lanes_cfg = self.cfg['buffer'].get('lanes') or [{'name': 'default'}]
+        self._lanes = []
+        self._lane_by_measurement = {}
+        self._default_lane = None
+        for lane_cfg in lanes_cfg:
+            eviction = lane_cfg.get('eviction', 'drop_oldest')
+            if eviction not in self.EVICTION_POLICIES:
+                raise ValueError('Unknown eviction policy for buffer lane ' + str(lane_cfg['name']) + ': '
+                                 + str(eviction))
+            lane = _Lane(lane_cfg['name'], self._create_store(lane_cfg, len(lanes_cfg) > 1), eviction)
+            self._lanes.append(lane)
+            for measurement in lane_cfg.get('measurements') or []:
+                self._lane_by_measurement[measurement] = lane
+            if not lane_cfg.get('measurements') and self._default_lane is None:
+                self._default_lane = lane
+        if self._default_lane is None:
+            self._default_lane = self._lanes[-1]
+
+        # Number of entities dropped due to overflow
+        self.dropped_points = 0
+
+        # Lock protecting the storage, the condition notifies consumers waiting for data
+        self._lock = threading.Lock()
+        self._data_available = threading.Condition(self._lock)
+        self._wakeups = 0
+
+    def _create_store(self, lane_cfg, own_dir):
+        """
+        This function creates the storage of a lane
+        :param lane_cfg: lane parameters, which may override max_size and spool_max_size
+        :param own_dir: if True, the lane is spooled into a subdirectory named after the lane
+        :return: ring or spool
+        """
+        buffer_cfg = self.cfg['buffer']
+        if not self.spooled:
+            return RingStore(lane_cfg.get('max_size', self.max_buffer_size))
+        spool_dir = buffer_cfg['spool_dir']
+        if own_dir:
+            spool_dir = os.path.join(spool_dir, lane_cfg['name'])
+        return Spool(spool_dir,
+                     segment_size=buffer_cfg.get('spool_segment_size', 1048576),
+                     fsync_every=buffer_cfg.get('spool_fsync_every', 50),
+                     max_size=lane_cfg.get('spool_max_size', buffer_cfg.get('spool_max_size')))
+
+    def _lane(self, buffer_entity):
+        """
+        This function returns the lane of an entity according to its measurement
+        :param buffer_entity: point or buffer entity
+        :return: lane
+        """
+        if len(self._lanes) == 1:
+            return self._default_lane
+        series = getattr(buffer_entity, 'series', None)
+        if series is not None:
+            measurement = series.measurement
+        else:
+            data = getattr(buffer_entity, 'data', None)
+            measurement = data.get('measurement') if isinstance(data, dict) else None
+        return self._lane_by_measurement.get(measurement, self._default_lane)
+
+    def restore(self):
+        """
+        This function replays unacknowledged entities from the spool after a restart
+        :return: number of restored entities
+        """
+        if not self.spooled:
+            return 0
+        restored = 0
+        for lane in self._lanes:
+            with self._lock:
+                count = lane.store.open()
+            restored += count
+            log_event(self.cfg, self.module_name, '', 'INFO', '%d unacknowledged point(s) restored from spool %s',
+                      count, lane.store.spool_dir)
+        return restored
+
+    def flush(self):
+        """
+        This function writes pending spool records to the disk. Buffer is the last stage of the processing pipeline.
+        :return:
+        """
+        if self.spooled:
+            with self._lock:
+                for lane in self._lanes:
+                    lane.store.request_sync()
+                persist = self._take_persist()
+            self._persist(persist)
+
+    def close(self):
+        """
+        This function flushes the spool to the disk
+        :return:
+        """
+        if self.spooled:
+            with self._lock:
+                for lane in self._lanes:
+                    lane.store.close()
+
+    def append(self, buffer_entity):
+        """
+        This function puts additional entity into its lane. If the lane is full, either the oldest entity of the lane
+        or the new one is dropped according to the eviction policy of the lane.
+        :param buffer_entity: buffer entity consisted of node instance and opcua variant
+        :return:
+        """
+        lane = self._lane(buffer_entity)
+        if self.spooled:
+            # Spool keeps entities already encoded in line protocol
+            res_conversion, data_line = buffer_entity.convert_to_line_protocol()
+            if not res_conversion:
+                log_event(self.cfg, self.module_name, '', 'ERR', 'Problem with generating line protocol: %s', data_line)
+                return
+            buffer_entity = data_line
+
+        with self._data_available:
+            if lane.eviction == 'drop_newest' and lane.store.full():
+                dropped = 1
+            else:
+                dropped = lane.store.append(buffer_entity)
+                self._data_available.notify_all()
+            lane.dropped += dropped
+            self.dropped_points += dropped
+            size = len(lane.store)
+            persist = self._take_persist()
+        self._persist(persist)
+
+        if dropped:
+            if lane.eviction == 'drop_newest':
+                lane.rejected_counter.inc(dropped)
+            else:
+                lane.evicted_counter.inc(dropped)
+            log_event(self.cfg, self.module_name, '', 'WARN', 'Buffer lane %s is full (%d), %d point(s) dropped so far',
+                      lane.name, size, lane.dropped)
+        log_event(self.cfg, self.module_name, '', 'INFO', 'Point copied into buffer lane %s (size=%d)', lane.name, size)
 
     def add_point(self, buffer_entity):
         """
@@ -74,15 +309,191 @@ class Buffer:
         :param buffer_entity: buffer entity consisted of node instance and opcua variant
         :return:
         """
+        self.append(buffer_entity)
+
+    def register_consumer(self, name):
+        """
+        This function registers a consumer with its own read cursors starting at the oldest entities
+        :param name: consumer name
+        :return: consumer name
+        """
+        with self._lock:
+            for lane in self._lanes:
+                lane.cursors.setdefault(name, lane.store.head_seq)
+        return name
+
+    def unregister_consumer(self, name):
+        """
+        This function removes a consumer, entities are not retained for it anymore
+        :param name: consumer name
+        :return:
+        """
+        with self._lock:
+            for lane in self._lanes:
+                lane.cursors.pop(name, None)
+                lane.reclaim()
+            persist = self._take_persist()
+        self._persist(persist)
+
+    def _take_persist(self):
+        """
+        This function captures the spool segments to be fsync'd after entities have been appended and the spool heads
+        to be persisted after entities have been released. The lock must be held.
+        :return: list of lanes and spool states
+        """
+        if not self.spooled:
+            return []
+        return [(lane, state) for lane in self._lanes for state in [lane.store.take_persist()] if state is not None]
+
+    def _persist(self, persist):
+        """
+        This function fsyncs spool segments and persists spool heads captured by _take_persist. It is called without
+        the lock, so that the disk I/O does not block producers and consumers.
+        :param persist: list of lanes and spool states
+        :return:
+        """
+        for lane, state in persist:
+            lane.store.persist(state)
+
+    def _read_spools(self, plans):
+        """
+        This function reads spooled entities planned under the lock. The files are read without the lock. If a segment
+        has been dropped due to overflow in the meantime, the entities read so far are returned.
+        :param plans: list of lanes, sequence numbers of the first entities and read plans
+        :return: position of the entities and list of entities
+        """
+        seq = []
+        buffer_entities = []
+        offsets = []
+        for lane, start, plan in plans:
+            data_lines, lane_offsets = Spool.read_records(plan)
+            if data_lines:
+                seq.append((lane, start, len(data_lines)))
+                buffer_entities.extend(SpooledEntity(data_line) for data_line in data_lines)
+                offsets.append((lane, lane_offsets))
+        if offsets:
+            # Offsets of the read entities spare the disk reads when they are released
+            with self._lock:
+                for lane, lane_offsets in offsets:
+                    lane.store.remember_offsets(lane_offsets)
+        return tuple(seq), buffer_entities
+
+    def _check_no_consumers(self, operation):
+        """
+        This function rejects operations bypassing consumer cursors, which would drop entities not yet processed by a
+        consumer or shift the positions its cursors refer to. The lock must be held.
+        :param operation: name of the operation
+        :return:
+        """
+        if self._lanes[0].cursors:
+            raise ValueError('Buffer ' + operation + ' without consumer is not allowed, registered consumers: '
+                             + ', '.join(sorted(self._lanes[0].cursors)))
+
+    def _pending(self, consumer=None):
+        """
+        This function returns the number of entities not yet committed by a consumer. The lock must be held.
+        :param consumer: consumer name, None - all entities in the buffer
+        :return:
+        """
+        return sum(lane.pending(consumer) for lane in self._lanes)
+
+    def wait_for_data(self, min_count=1, timeout=None, interrupted=None, consumer=None):
+        """
+        This function blocks until the buffer holds at least min_count entities, the timeout expires or the waiting
+        consumer is woken up by wake()
+        :param min_count: number of entities to wait for
+        :param timeout: maximal waiting time in seconds, None - no limit
+        :param interrupted: optional function returning True if the consumer should stop waiting
+        :param consumer: consumer name, if given only entities not yet committed by it are counted
+        :return: True if at least min_count entities are in the buffer
+        """
+        with self._data_available:
+            wakeups = self._wakeups
+            self._data_available.wait_for(
+                lambda: (self._pending(consumer) >= min_count or self._wakeups != wakeups
+                         or (interrupted is not None and interrupted())),
+                timeout)
+            return self._pending(consumer) >= min_count
+
+    def wake(self):
+        """
+        This function wakes up all consumers waiting for data, e.g. on shutdown
+        :return:
+        """
+        with self._data_available:
+            self._wakeups += 1
+            self._data_available.notify_all()
+
+    def peek_batch(self, n, consumer=None):
+        """
+        This function returns up to n oldest entities without removing them from the buffer. Lanes are read in the
+        order of their priority.
+        :param n: maximal number of entities
+        :param consumer: consumer name, if given the entities are read from its cursors
+        :return: position of the batch, which is passed to commit, and list of entities
+        """
+        seq = []
+        buffer_entities = []
+        plans = []
+        planned = 0
+        with self._lock:
+            for lane in self._lanes:
+                if planned >= n:
+                    break
+                start = lane.store.head_seq
+                offset = 0 if consumer is None else max(lane.cursors[consumer] - start, 0)
+                if self.spooled:
+                    # Spool files are read after the lock is released
+                    plan = lane.store.read_plan(n - planned, offset)
+                    if plan:
+                        plans.append((lane, start + offset, plan))
+                        planned += sum(item[-1] for item in plan)
+                    continue
+                lane_entities = lane.store.read(n - planned, offset)
+                if lane_entities:
+                    seq.append((lane, start + offset, len(lane_entities)))
+                    buffer_entities.extend(lane_entities)
+                    planned += len(lane_entities)
+        if self.spooled:
+            return self._read_spools(plans)
+        return tuple(seq), buffer_entities
 
-        # If after adding a point, the buffer will be overfilled, we will remove the first entity in the buffer
-        if len(self.buffer) + 1 > self.max_buffer_size:
-            self.remove_point(0)
-            log_event(self.cfg, self.module_name, '', 'WARN', 'Buffer is full (' + str(len(self.buffer)) + ')')
+    def commit(self, n, seq=None, consumer=None):
+        """
+        This function drops n oldest entities after they have been successfully processed.
+        :param n: number of processed entities
+        :param seq: position returned by peek_batch. If provided, entities dropped due to overflow since the peek are
+        taken into account, so that no unprocessed entity is removed.
+        :param consumer: consumer name, if given its cursors are advanced and only entities committed by all consumers
+        are removed. It is required once consumers are registered.
+        :return: number of removed entities
+        """
+        with self._lock:
+            if consumer is None:
+                self._check_no_consumers('commit')
+            if seq is None:
+                seq = []
+                for lane in self._lanes:
+                    start = lane.store.head_seq if consumer is None else max(lane.cursors[consumer],
+                                                                             lane.store.head_seq)
+                    seq.append((lane, start, lane.pending(consumer)))
+            count = 0
+            for lane, start, lane_count in seq:
+                if n <= 0:
+                    break
+                processed = min(n, lane_count)
+                n -= processed
+                if consumer is None:
+                    count += lane.store.release(max(start + processed - lane.store.head_seq, 0))
+                else:
+                    lane.cursors[consumer] = max(lane.cursors[consumer], start + processed)
+                    count += lane.reclaim()
+            size = self._pending()
+            persist = self._take_persist()
+        self._persist(persist)
 
-        # Append entity
-        self.buffer.append(buffer_entity)
-        log_event(self.cfg, self.module_name, '', 'INFO', 'Point copied into buffer (size=' + str(self.len()) + ')')
+        log_event(self.cfg, self.module_name, '', 'INFO', '%d points removed from buffer (size=%d)', count, size)
+        return count
 
     def remove_point(self, idx=0):
         """
@@ -90,40 +501,91 @@ class Buffer:
         :param idx: Index of the element to remove
         :return:
         """
-
-        # Removing operation is only valid if valid index is provided
-        if (idx < 0) or (idx > len(self.buffer) - 1):
-            log_event(self.cfg, self.module_name, '', 'WARN', str(idx) + ' element does not exist in buffer')
-            return
-        del self.buffer[idx]
-        log_event(self.cfg, self.module_name, '', 'INFO',
-                  'Point ' + str(idx) + ' removed from buffer (size=' + str(self.len()) + ')')
+        self.remove_points([idx])
 
     def remove_points(self, idx):
         """
-        This function removes a set of elements.
+        This function removes a set of elements, which are indexed over the lanes in the order of their priority. The
+        spool supports removal of leading elements only. Elements cannot be removed once consumers are registered.
         :param idx: list of indices
         :return:
         """
         # Removing duplicates
-        idx = list(dict.fromkeys(idx))
+        idx = set(idx)
+
+        removed = 0
+        with self._lock:
+            self._check_no_consumers('remove_points')
+            invalid = {i for i in idx if not 0 <= i < self._pending()}
+            idx -= invalid
+
+            offset = 0
+            for lane in self._lanes:
+                lane_size = len(lane.store)
+                lane_idx = {i - offset for i in idx if offset <= i < offset + lane_size}
+                offset += lane_size
+
+                # Leading elements are released from the head, the rest is removed from the ring at once
+                leading = 0
+                while leading in lane_idx:
+                    leading += 1
+                lane.store.release(leading)
+                lane_idx = {i - leading for i in lane_idx if i >= leading}
+                if lane_idx and not self.spooled:
+                    lane.store.discard(lane_idx)
+                elif lane_idx:
+                    invalid |= {i + offset - lane_size + leading for i in lane_idx}
+                    lane_idx = set()
+                removed += leading + len(lane_idx)
+            size = self._pending()
+            persist = self._take_persist()
+        self._persist(persist)
 
-        # Loop within sorted and reversed list
-        for i in sorted(idx, reverse=True):
-            self.remove_point(i)
+        for i in sorted(invalid):
+            log_event(self.cfg, self.module_name, '', 'WARN', '%d element cannot be removed from buffer', i)
         log_event(self.cfg, self.module_name, '', 'INFO',
-                  str(len(idx)) + ' points removed from buffer (size=' + str(self.len()) + ')')
+                  '%d points removed from buffer (size=%d)', removed, size)
 
-    def len(self):
+    def len(self, consumer=None):
         """
         This function returns the actual length of the buffer
+        :param consumer: consumer name, if given only entities not yet committed by it are counted
         :return: Actual length of the buffer
         """
-        return len(self.buffer)
+        with self._lock:
+            return self._pending(consumer)
+
+    def get_heads(self, consumer=None):
+        """
+        This function returns the oldest entity of every lane, which has not been committed yet
+        :param consumer: consumer name, if given the entities at its cursors are returned
+        :return: list of entities
+        """
+        buffer_entities = []
+        plans = []
+        with self._lock:
+            for lane in self._lanes:
+                offset = 0 if consumer is None else max(lane.cursors[consumer] - lane.store.head_seq, 0)
+                if self.spooled:
+                    plans.append((lane, lane.store.head_seq + offset, lane.store.read_plan(1, offset)))
+                else:
+                    buffer_entities.extend(lane.store.read(1, offset))
+        if self.spooled:
+            return self._read_spools(plans)[1]
+        return buffer_entities
+
+    def get_lane_statistics(self):
+        """
+        This function returns size and number of dropped entities of every lane
+        :return: dict with lane names as keys and dicts with size and dropped as values
+        """
+        with self._lock:
+            return {lane.name: {'size': len(lane.store), 'dropped': lane.dropped} for lane in self._lanes}
 
     def get_snapshot(self):
         """
-        This function creates a snapshot of the buffer in order to decouple data with the mutable list object
+        This function creates a snapshot of the buffer in order to decouple data with the mutable storage. Consumers
+        should prefer peek_batch, which copies only the requested number of entities.
         :return:
         """
-        return list(self.buffer)
+        return self.peek_batch(self.len())[1]
@@ -0,0 +1,207 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.event_logger import log_event
+
+
+class AsyncRuntime:
+    """
+    Runtime executing data collection, control steps, connectivity checks and ingestion as tasks of a single asyncio
+    event loop. Blocking GPIO/I2C and HTTP calls are offloaded to a thread pool executor, stop requests are delivered
+    through events, so that waiting tasks are woken up immediately. Ingestion, which blocks while waiting for data,
+    runs on an own thread outside the pool, so that it never occupies a worker needed by the periodic tasks.
+    """
+
+    def __init__(self, cfg, edge_node, idb):
+        """
+        Initialisation
+        :param cfg: Set of parameters including the control interval and the executor size
+        :param edge_node: edge node, whose activities are scheduled
+        :param idb: influxdb writer, whose activities are scheduled
+        """
+        self.module_name = 'Async'
+        self.cfg = cfg
+        self.edge_node = edge_node
+        self.idb = idb
+        edge_node.runtime = self
+        idb.runtime = self
+
+        self.loop = None
+        self._thread = None
+
+        # Every sampling channel, the control and the connectivity task may block in the executor at the same time
+        required_workers = len(edge_node.sampling_channels) + 2
+        executor_workers = cfg.get('runtime', {}).get('executor_workers') or required_workers
+        if executor_workers < required_workers:
+            raise ValueError('runtime/executor_workers must be at least ' + str(required_workers) +
+                             ' (sampling channels, control and connectivity), got ' + str(executor_workers))
+        self._executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix='AsyncRuntime')
+        # The writer runs at most one ingestion worker, a new one starts after the previous one has returned
+        self._ingestion_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='AsyncRuntime-Ingestion')
+        self._started = threading.Event()
+        self._start_lock = threading.Lock()
+
+        # Events and tasks living in the event loop
+        self._stop = None
+        self._stop_control = None
+        self._control_task = None
+        self._ingestion_task = None
+        self._tasks = []
+
+    def start(self):
+        """
+        This function starts the event loop in a separate thread. Repeated calls have no effect.
+        :return:
+        """
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='AsyncRuntime')
+            self._thread.start()
+        self._started.wait()
+
+    def stop(self):
+        """
+        This function stops all tasks and waits until the event loop is closed
+        :return:
+        """
+        if self._thread is None or not self._started.is_set():
+            return
+        if self._thread is threading.current_thread():
+            self._stop.set()
+            return
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join()
+
+    def start_control(self):
+        """
+        This function starts the control task, if it is not running yet
+        :return:
+        """
+        self._call(self._start_control)
+
+    def stop_control(self):
+        """
+        This function stops the control task and waits for the completion of the running control step
+        :return:
+        """
+        self._call(self._stop_control_task)
+
+    def start_ingestion(self):
+        """
+        This function starts the ingestion task, if it is not running yet
+        :return:
+        """
+        self._call(self._start_ingestion)
+
+    def _call(self, coroutine_function):
+        """
+        This function executes a coroutine in the event loop and waits for its result
+        :param coroutine_function: coroutine function without arguments
+        :return:
+        """
+        self.start()
+        if self._thread is threading.current_thread():
+            return self.loop.create_task(coroutine_function())
+        return asyncio.run_coroutine_threadsafe(coroutine_function(), self.loop).result()
+
+    def _run(self):
+        """
+        This function runs the event loop until stopped
+        :return:
+        """
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self._main())
+        finally:
+            self.loop.close()
+            self._executor.shutdown(wait=True)
+            self._ingestion_executor.shutdown(wait=True)
+            log_event(self.cfg, self.module_name, '', 'INFO', 'Event loop closed')
+
+    async def _main(self):
+        """
+        This function creates all tasks and waits for the stop event
+        :return:
+        """
+        self._stop = asyncio.Event()
+        self._stop_control = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._periodic(channel, self._stop))
+                       for channel in self.edge_node.sampling_channels]
+        self._tasks.append(asyncio.create_task(self._connectivity()))
+        if self.edge_node.auto_mode_requested:
+            await self._start_control()
+        self._started.set()
+        log_event(self.cfg, self.module_name, '', 'INFO', 'Event loop started')
+
+        await self._stop.wait()
+
+        # Deterministic shutdown: control first, then data collection, then connectivity and ingestion
+        await self._stop_control_task()
+        self.idb._stop_ingestion()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._ingestion_task is not None:
+            await asyncio.gather(self._ingestion_task, return_exceptions=True)
+
+    async def _blocking(self, function, *args):
+        """
+        This function executes a blocking function in the executor
+        :param function: blocking function
+        :param args: arguments
+        :return: result of the function
+        """
+        return await self.loop.run_in_executor(self._executor, function, *args)
+
+    @staticmethod
+    async def _wait(event, timeout):
+        """
+        This function waits for an event or a timeout
+        :param event: asyncio event
+        :param timeout: timeout in seconds
+        :return: True if the event is set
+        """
+        if timeout > 0:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return event.is_set()
+
+    async def _periodic(self, channel, stop):
+        """
+        This task executes a periodic channel at its absolute deadlines until the stop event is set
+        :param channel: periodic channel
+        :param stop: asyncio stop event
+        :return:
+        """
+        channel.reset(self.loop.time())
+        while not await self._wait(stop, channel.next_deadline - self.loop.time()):
+            started = self.loop.time()
+            await self._blocking(channel.callback)
+            channel.complete(started, self.loop.time())
+
+    async def _start_control(self):
+        if self._control_task is None or self._control_task.done():
+            self._stop_control.clear()
+            self._control_task = asyncio.create_task(self._periodic(self.edge_node.control_channel,
+                                                                    self._stop_control))
+
+    async def _stop_control_task(self):
+        if self._control_task is not None:
+            self._stop_control.set()
+            await asyncio.gather(self._control_task, return_exceptions=True)
+            self._control_task = None
+
+    async def _connectivity(self):
+        """
+        This task checks the connection to the INFLUXDB server and reconnects as required
+        :return:
+        """
+        while not await self._wait(self._stop, await self._blocking(self.idb._connectivity_step)):
+            pass
+        await self._blocking(self.idb.disconnect)
+
+    async def _start_ingestion(self):
+        # The writer requests a worker only if none is running, a previous worker may still be returning
+        self._ingestion_task = self.loop.run_in_executor(self._ingestion_executor, self.idb._ingest_data)
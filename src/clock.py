@@ -0,0 +1,60 @@
+import time
+
+
+class SystemClock:
+    """
+    Clock backed by the system: wall-clock time for timestamps, monotonic time for scheduling
+    """
+
+    @staticmethod
+    def time():
+        return time.time()
+
+    @staticmethod
+    def monotonic():
+        return time.monotonic()
+
+    @staticmethod
+    def sleep(seconds):
+        time.sleep(seconds)
+
+
+class SimulatedClock:
+    """
+    Clock advanced explicitly, so that time-dependent code runs faster than real time. Sleeping advances the clock
+    immediately.
+    """
+
+    def __init__(self, start_time=None):
+        """
+        Initialisation
+        :param start_time: wall-clock time in seconds at monotonic time 0, by default the current time
+        """
+        self.start_time = time.time() if start_time is None else start_time
+        self.now = 0.0
+
+    def time(self):
+        return self.start_time + self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        """
+        This function advances the clock
+        :param seconds: time span in seconds
+        :return:
+        """
+        if seconds > 0:
+            self.now += seconds
+
+    def advance_to(self, monotonic_time):
+        """
+        This function advances the clock to a monotonic time, earlier times are ignored
+        :param monotonic_time: monotonic time in seconds
+        :return:
+        """
+        self.now = max(self.now, monotonic_time)
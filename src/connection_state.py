@@ -0,0 +1,159 @@
+import random
+import threading
+from src.clock import SystemClock
+
+
+class ExponentialBackoff:
+    """
+    Retry delays growing exponentially from an initial delay up to a maximal delay. A random part of each delay is
+    subtracted (jitter), so that several clients do not retry in lockstep after an outage.
+    """
+
+    def __init__(self, initial, maximum, multiplier=2.0, jitter=0.5, seed=None):
+        """
+        Initialisation
+        :param initial: first delay in s
+        :param maximum: maximal delay in s
+        :param multiplier: growth factor of the delay after each failure
+        :param jitter: fraction of the delay, which is randomised (0 - fixed delays, 1 - between 0 and the delay)
+        :param seed: seed of the random generator
+        """
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.attempts = 0
+        self._random = random.Random(seed)
+
+    def next_delay(self):
+        """
+        This function returns the delay before the next attempt and counts the failed attempt
+        :return: delay in s
+        """
+        delay = min(self.initial * self.multiplier ** self.attempts, self.maximum)
+        self.attempts += 1
+        return delay * (1 - self.jitter * self._random.random())
+
+    def reset(self):
+        """
+        This function restarts the delays from the initial one after a successful attempt
+        :return:
+        """
+        self.attempts = 0
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker around requests. After failure_threshold consecutive failures the circuit opens and requests are
+    not attempted for reset_timeout. Afterwards the circuit is half-open: a single trial request either closes the
+    circuit or opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0, clock=None):
+        """
+        Initialisation
+        :param failure_threshold: number of consecutive failures opening the circuit
+        :param reset_timeout: time in s, during which an open circuit rejects requests
+        :param clock: clock providing monotonic time, by default the system clock
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock if clock is not None else SystemClock()
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock.monotonic() - self.opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self):
+        """
+        This function checks whether a request may be attempted
+        :return: True unless the circuit is open
+        """
+        return self.state != self.OPEN
+
+    def retry_after(self):
+        """
+        This function returns the time until an open circuit becomes half-open
+        :return: time in s, 0 if the circuit is not open
+        """
+        if self.opened_at is None:
+            return 0.0
+        return max(self.opened_at + self.reset_timeout - self.clock.monotonic(), 0.0)
+
+    def record_success(self):
+        """
+        This function closes the circuit after a successful request
+        :return:
+        """
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        """
+        This function counts a failed request and opens the circuit if required
+        :return: True if the circuit has been opened by this failure
+        """
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.opened_at is None and self.failures >= self.failure_threshold):
+            self.opened_at = self.clock.monotonic()
+            self.trips += 1
+            return True
+        return False
+
+
+class StateTimer:
+    """
+    Current state of a state machine together with the accumulated time spent in each state and the number of
+    transitions. The state may be read from other threads.
+    """
+
+    def __init__(self, initial_state, clock=None):
+        """
+        Initialisation
+        :param initial_state: initial state
+        :param clock: clock providing monotonic time, by default the system clock
+        """
+        self.clock = clock if clock is not None else SystemClock()
+        self.state = initial_state
+        self.transitions = 0
+        self._entered = self.clock.monotonic()
+        self._durations = {}
+        self._lock = threading.Lock()
+
+    def transition(self, state):
+        """
+        This function changes the state
+        :param state: new state
+        :return: time in s spent in the previous state, None if the state is unchanged
+        """
+        with self._lock:
+            if state == self.state:
+                return None
+            now = self.clock.monotonic()
+            duration = now - self._entered
+            self._durations[self.state] = self._durations.get(self.state, 0.0) + duration
+            self.state = state
+            self._entered = now
+            self.transitions += 1
+            return duration
+
+    def time_in_state(self):
+        """
+        This function returns the accumulated time spent in each state including the current one
+        :return: dict with states as keys and times in s as values
+        """
+        with self._lock:
+            durations = dict(self._durations)
+            durations[self.state] = durations.get(self.state, 0.0) + self.clock.monotonic() - self._entered
+        return durations
@@ -1,13 +1,14 @@
 import threading
-import time
+from src.clock import SystemClock
 from src.gpio_reader_writer import GPIODataReaderWriter
 from src.event_logger import log_event
-from src.Buffer import BufferEntity
-
-import board
-import busio
-import adafruit_ads1x15.ads1015 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
+from src.metrics import metrics_registry
+from src.point import Point, registry
+from src.pipeline import PipelineStage
+from src.window_stats import WindowStatistics
+from src.relay_table import RelayTable
+from src.scheduler import PeriodicChannel, Scheduler
+from src.status import StatusSnapshot
 
 
 class EdgeNode:
@@ -15,17 +16,46 @@ class EdgeNode:
     This class represents the controller and its methods
     """
 
-    def __init__(self, cfg, buffer):
-
+    def __init__(self, cfg, buffer, clock=None):
+        """
+        Initialisation
+        :param cfg: Set of parameters
+        :param buffer: processing pipeline or buffer receiving the collected data points
+        :param clock: clock for timestamps and scheduling, by default the system clock
+        """
         self.module_name = 'EdgeNd'
         self.buffer = buffer
+        self.clock = clock if clock is not None else SystemClock()
         self.running = False
 
         # Read information from config file
         self.cfg = cfg
 
-        # Threads
-        self._control_thread = None
+        # Sampling channels with individual rates and the control channel, executed by schedulers with absolute
+        # deadlines
+        sampling_cfg = self.cfg.get('sampling', {})
+        self.sampling_channels = [
+            PeriodicChannel.from_rate('regime', sampling_cfg.get('regime_rate', 1), self._data_collection_step_regime),
+            PeriodicChannel.from_rate('voltage', sampling_cfg.get('voltage_rate', 1),
+                                      self._data_collection_step_voltage_input),
+            PeriodicChannel.from_rate('outputs', sampling_cfg.get('outputs_rate', 1),
+                                      self._data_collection_step_output_states),
+        ]
+        control_interval = self.cfg['controller']['control_interval']
+        self.control_channel = PeriodicChannel('control', control_interval, self._control_step,
+                                               start_delay=control_interval)
+        self._sampling_scheduler = Scheduler('DataCollection', self.sampling_channels, clock=self.clock.monotonic)
+        self._control_scheduler = Scheduler('Control', [self.control_channel], clock=self.clock.monotonic)
+        for channel in self.sampling_channels + [self.control_channel]:
+            labels = {'channel': channel.name}
+            channel.jitter_histogram = metrics_registry.histogram(
+                'edge_node_step_jitter_seconds', 'Delay between the deadline and the start of a step', labels)
+            channel.duration_histogram = metrics_registry.histogram(
+                'edge_node_step_duration_seconds', 'Duration of sampling and control steps', labels)
+        self.relay_switches = metrics_registry.counter('edge_node_relay_switches_total', 'Relay state changes')
+
+        # Asynchronous runtime, if the edge node is driven by an event loop instead of own threads
+        self.runtime = None
 
         # Mode
         self.auto_mode_requested = True
@@ -35,7 +65,14 @@ class EdgeNode:
         # Control input
         self.voltage_average = 0
         self.voltage_value = None
-        self._voltage_data = []
+        # Voltage window covering one control interval by default, the controller evaluates the configured filter
+        controller_cfg = self.cfg['controller']
+        self.voltage_statistics = WindowStatistics(
+            controller_cfg.get('voltage_window') or
+            max(round(sampling_cfg.get('voltage_rate', 1) * control_interval), 1),
+            filter=controller_cfg.get('voltage_filter', 'mean'),
+            ewma_alpha=controller_cfg.get('voltage_ewma_alpha', 0.2))
+        self._voltage_evaluated = 0
         self.mapping_table = [
                 [1, 3, 5, 10],
                 [2, -3, -5, 6],
@@ -61,31 +98,55 @@ class EdgeNode:
                 [6, 12],
                 [-4, 5, -6],
         ]
+        # Relay bitmask per consumption level, loaded from the relay map workbook if configured
+        relay_map = controller_cfg.get('relay_map')
+        self.relay_table = RelayTable.from_xlsx(relay_map) if relay_map else RelayTable.from_changes(self.mapping_table)
+        self._relay_mask = 0
         self.load = 0
 
         # Current regime
         self.regime = 0
         self.regime_str = ""
 
-        # Control output 
-        self.gpio_interface = GPIODataReaderWriter(not self.cfg['simulation']['active'])
+        # Series of collected data points
+        influxdb_cfg = self.cfg['influxdb']
+        voltage_sensor_cfg = self.cfg['gpio']['voltage_sensor']
+        self._regime_series = registry.register(influxdb_cfg['regime_measurement_name'])
+        self._voltage_series = registry.register(influxdb_cfg['voltage_measurement_name'],
+                                                 {'Unit': 'V',
+                                                  'SclMin': voltage_sensor_cfg['scale_min'],
+                                                  'SclMax': voltage_sensor_cfg['scale_max']})
+        self._output_series = registry.register(
+            influxdb_cfg['output_measurement_name'], None,
+            tuple('Output%02d' % (i + 1) for i in range(len(self.cfg['gpio']['relays_outputs']['channels']))))
+        self._state_series = registry.register(influxdb_cfg['state_measurement_name'], {'Unit': 'V'})
+        self._consumption_series = registry.register(influxdb_cfg['consumption_measurement_name'])
+        self._mode_series = registry.register(influxdb_cfg['mode_measurement_name'])
 
-        # Reset outputs
-        self._set_consumption_level(-1)
+        # Control output 
+        self.gpio_interface = GPIODataReaderWriter(self.cfg)
+        regime_inputs_cfg = self.cfg['gpio']['regime_inputs']
+        self._regime_channels = [regime_inputs_cfg['absorb'], regime_inputs_cfg['float']]
+        self.gpio_interface.configure_outputs(self.cfg['gpio']['relays_outputs']['channels'])
+        self.gpio_interface.configure_inputs(self._regime_channels)
+
+        # Reset outputs, all relays are written once as their state is unknown
+        self.status = None
+        self._status_changed = threading.Condition()
+        self._set_consumption_level(-1, force=True)
         self.consumption_level = 0
-
-        # Internal flags
-        self._stop_edge = False
-        self._stop_control = False
-        self._stopped_control = False
-        self._stop_data_collection = False
-        self._stopped_data_collection = False
+        self.publish_status()
 
     def start(self):
         """
         This methods starts data collection and controller
         :return:
         """
+        if self.runtime is not None:
+            self.runtime.start()
+            self.running = True
+            log_event(self.cfg, self.module_name, '', 'INFO', 'Data collection and controller started in event loop')
+            return
         self._run_data_collection()
         self._run_control()
 
@@ -94,33 +155,13 @@ class EdgeNode:
         This methods starts the control as a single thread
         :return:
         """
-        self._stop_control = False
-        self._stopped_control = False
-        self._control_thread = threading.Thread(target=self._control)
-        self._control_thread.start()
+        if self.runtime is not None:
+            self.runtime.start_control()
+        else:
+            self._control_scheduler.start()
         log_event(self.cfg, self.module_name, '', 'INFO', 'Controller started')
         self.running = True
 
-    def _control(self):
-        """
-        This method executes control steps until the stop flag is set
-        :return:
-        """
-        while not self._stop_control:
-            control_step_begin = time.time()
-            while self.cfg['controller']['control_interval'] - (time.time() - control_step_begin) > 1:
-                if not self._stop_control:
-                    time.sleep(0.1)
-                else:
-                    break
-            if self._stop_control:
-                break
-            self._control_step()
-            time_till_step_end = self.cfg['controller']['control_interval'] - (time.time() - control_step_begin)
-            if time_till_step_end > 0:
-                time.sleep(time_till_step_end)
-        self._stopped_control = True
-
     def _control_step(self):
         """
         This method represents a single control step. The last voltage data points is evaluated to define output level
@@ -134,8 +175,9 @@ class EdgeNode:
 
     def read_regime(self):
         regime_names = ['not defined', 'bulk', 'absorb', 'float']
-        input_absorb = self.gpio_interface.read_value('GPIO', self.cfg['gpio']['regime_inputs']['absorb'])
-        input_float = self.gpio_interface.read_value('GPIO', self.cfg['gpio']['regime_inputs']['float'])
+        inputs = self.gpio_interface.read_many(self._regime_channels)
+        input_absorb = inputs & 1
+        input_float = inputs & 2
         if input_absorb and not input_float:
             regime = 2
         elif not input_absorb and input_float:
@@ -147,7 +189,7 @@ class EdgeNode:
         regime = 2
         self.regime = regime
         self.regime_str = regime_names[regime]
-        log_event(self.cfg, self.module_name, '', 'INFO', 'Phase: ' + regime_names[self.regime])
+        log_event(self.cfg, self.module_name, '', 'INFO', 'Phase: %s', regime_names[self.regime])
 
     def increase_consumption_level(self):
         self._set_consumption_level(self.consumption_level+1)
@@ -155,45 +197,38 @@ class EdgeNode:
     def decrease_consumption_level(self):
         self._set_consumption_level(self.consumption_level-1)
 
-    def _set_consumption_level(self, level):
+    def _set_consumption_level(self, level, force=False):
         """
-        This method sets gpio outputs to get the desired consumption level
-        :param level: consumption level
+        This method sets gpio outputs to get the desired consumption level. Only relays, whose state differs between
+        the current and the desired level, are written.
+        :param level: consumption level, -1 resets all outputs
+        :param force: if True, all relays are written
         :return:
         """
         if level == -1:
-            changes = [-1, -2, -3, -4, -5, -6, -7, -8, -9, -10, -11, -12, -13]
             level = 0
-        else:
-            if level > self.consumption_level:
-                changes = self.mapping_table[level - 1]
-            else:
-                changes = [-x for x in self.mapping_table[level]]
-
-        for change in changes:
-            channel = self.cfg['gpio']['relays_outputs']['channels'][abs(change)-1]
-            desired_state = change > 0
-            self.gpio_interface.write_gpio(channel, desired_state)
-
-        log_event(self.cfg, self.module_name, '', 'INFO', 'Consumption level set on ' + str(level))
+        if not 0 <= level < self.relay_table.levels():
+            log_event(self.cfg, self.module_name, '', 'WARN', 'Consumption level %s is out of range', level)
+            return
+
+        channels = self.cfg['gpio']['relays_outputs']['channels']
+        target_mask = self.relay_table.mask(level)
+        current_mask = ~target_mask & ((1 << len(channels)) - 1) if force else self._relay_mask
+        changes = RelayTable.changes(current_mask, target_mask)
+        self.gpio_interface.write_many({channels[relay]: desired_state for relay, desired_state in changes})
+        self._relay_mask = target_mask
+        self.relay_switches.inc(len(changes))
+
+        log_event(self.cfg, self.module_name, '', 'INFO', 'Consumption level set on %d', level)
         self.load = self.cfg['controller']['loads'][level]
         self.consumption_level = level
 
-        data_point = BufferEntity(
-            {'measurement': self.cfg['influxdb']['state_measurement_name'],
-             'tags': {'Unit': 'V'},
-             'fields': {'Value': level},
-             'timestamp': round(time.time() * 1000)}
-        )
-        self.buffer.add_point(data_point)
-
-        data_point_consumption = BufferEntity(
-            {'measurement': self.cfg['influxdb']['consumption_measurement_name'],
-             'fields': {'Value': self.cfg['controller']['loads'][level]},
-             'timestamp': round(time.time() * 1000)}
-        )
-        self.buffer.add_point(data_point_consumption)
-        log_event(self.cfg, self.module_name, '', 'INFO', 'Consumption level ' + str(self.consumption_level))
+        timestamp = round(self.clock.time() * 1000)
+        self.buffer.add_point(Point(self._state_series, timestamp, (level,)))
+        self.buffer.add_point(Point(self._consumption_series, timestamp, (self.cfg['controller']['loads'][level],)))
+        log_event(self.cfg, self.module_name, '', 'INFO', 'Consumption level %d', self.consumption_level)
+        if self.status is not None:
+            self.publish_status()
 
     def _voltage_evaluation(self):
         """
@@ -203,14 +238,15 @@ class EdgeNode:
 
         new_level = self.consumption_level
 
-        voltage_values = self._voltage_data
-
-        if not len(voltage_values):
+        # Evaluate only if voltage samples have been collected since the last control step
+        collected = self.voltage_statistics.total()
+        if collected == self._voltage_evaluated:
             log_event(self.cfg, self.module_name, '', 'WARN', 'Not enough voltage data points for evaluation')
             return new_level
+        self._voltage_evaluated = collected
 
-        avg_voltage = sum(voltage_values) / len(voltage_values)
-        log_event(self.cfg, self.module_name, '', 'INFO', 'Calculated average value:' + str(avg_voltage))
+        avg_voltage = self.voltage_statistics.value()
+        log_event(self.cfg, self.module_name, '', 'INFO', 'Calculated average value: %s', avg_voltage)
 
         if avg_voltage <= self.cfg['controller']['voltage_critical_level']:
             log_event(self.cfg, self.module_name, '', 'INFO', 'The voltage level is too low')
@@ -221,27 +257,25 @@ class EdgeNode:
 
         if self.regime == 1:
             if avg_voltage >= self.cfg['controller']['voltage_absorb_limit_max']:
-                new_level = min(new_level+1, 23)
+                new_level = min(new_level + 1, self.relay_table.levels() - 1)
                 log_event(self.cfg, self.module_name, '', 'INFO',
-                          'The consumption level is to increase: ' + str(avg_voltage) + '>=' + str(self.voltage_average))
+                          'The consumption level is to increase: %s>=%s', avg_voltage, self.voltage_average)
             if avg_voltage <= self.cfg['controller']['voltage_absorb_limit_min']:
                 new_level = max(new_level - 1, 0)
                 log_event(self.cfg, self.module_name, '', 'INFO',
-                          'The consumption level is to decrease: ' + str(avg_voltage) + '<=' + str(self.voltage_average))
+                          'The consumption level is to decrease: %s<=%s', avg_voltage, self.voltage_average)
 
         if self.regime == 2:
             if avg_voltage >= self.cfg['controller']['voltage_float_limit_max']:
-                new_level = min(new_level+1, 23)
+                new_level = min(new_level + 1, self.relay_table.levels() - 1)
                 log_event(self.cfg, self.module_name, '', 'INFO',
-                          'The consumption level is to increase: ' + str(avg_voltage) + '>=' + str(self.voltage_average))
+                          'The consumption level is to increase: %s>=%s', avg_voltage, self.voltage_average)
             if avg_voltage <= self.cfg['controller']['voltage_float_limit_min']:
                 new_level = max(new_level - 1, 0)
                 log_event(self.cfg, self.module_name, '', 'INFO',
-                          'The consumption level is to decrease: ' + str(avg_voltage) + '<=' + str(self.voltage_average))
+                          'The consumption level is to decrease: %s<=%s', avg_voltage, self.voltage_average)
 
         self.voltage_average = avg_voltage
-
-        del self._voltage_data[0:len(voltage_values)]
         return new_level
 
     def _run_data_collection(self):
@@ -249,30 +283,9 @@ class EdgeNode:
         This methods starts the data collection
         :return:
         """
-        self._stop_data_collection = False
-        self._stopped_data_collection = False
-
-        self._data_collection_thread = threading.Thread(target=self._data_collection)
-        self._data_collection_thread.start()
+        self._sampling_scheduler.start()
         log_event(self.cfg, self.module_name, '', 'INFO', 'Data collection started')
 
-    def _data_collection(self):
-        """
-        This method executes repeatedly the data collection step unless stopped
-        :return:
-        """
-        while not self._stop_data_collection:
-            start_time = time.time()
-            self._data_collection_step_regime()
-            self._data_collection_step_voltage_input()
-            self._data_collection_step_output_states()
-            time_till_next_step = 1 - (time.time() - start_time)
-            if time_till_next_step > 0:
-                time.sleep(time_till_next_step)
-        else:
-            self._stopped_data_collection = True
-            log_event(self.cfg, self.module_name, '', 'INFO', 'Data collection stopped')
-
     def _data_collection_step_regime(self):
         """
         This method is a single data collection step
@@ -280,57 +293,80 @@ class EdgeNode:
         """
 
         # Add regime data point in buffer
-        data_point = BufferEntity(
-            {'measurement': self.cfg['influxdb']['regime_measurement_name'],
-             'fields': {'Value': self.regime},
-             'timestamp': round(time.time() * 1000)}
-        )
-        self.buffer.add_point(data_point)
+        self.buffer.add_point(Point(self._regime_series, round(self.clock.time() * 1000), (self.regime,)))
 
     def _data_collection_step_voltage_input(self):
         """
         This method is a single data collection step
         :return:
         """
-        voltage_value = self.gpio_interface.read_value('i2c', self.cfg['gpio']['voltage_sensor'])
-        log_event(self.cfg, self.module_name, '', 'INFO', 'Data point collected ' + str(voltage_value))
-        self._voltage_data.append(voltage_value)
+        # Analog inputs are read in one scan of the ADC
+        voltage_value, = self.gpio_interface.read_scan([self.cfg['gpio']['voltage_sensor']])
+        log_event(self.cfg, self.module_name, '', 'INFO', 'Data point collected %s', voltage_value)
+        self.voltage_statistics.add(voltage_value)
 
         self.voltage_value = voltage_value
 
-        # Add voltage data point in buffer
-        data_point = BufferEntity(
-            {'measurement': self.cfg['influxdb']['voltage_measurement_name'],
-             'tags': {'Unit': 'V',
-                      'SclMin': self.cfg['gpio']['voltage_sensor']['scale_min'],
-                      'SclMax': self.cfg['gpio']['voltage_sensor']['scale_max']},
-             'fields': {'Value': voltage_value},
-             'timestamp': round(time.time() * 1000)}
-        )
-        self.buffer.add_point(data_point)
+        # Add voltage data point in buffer, the pipeline reduces the recorded rate
+        self.buffer.add_point(Point(self._voltage_series, round(self.clock.time() * 1000), (voltage_value,)))
 
     def _data_collection_step_output_states(self):
         output_state = self.get_gpio_state()
 
         # Add data point in buffer
-        data_point_level = BufferEntity(
-            {'measurement': self.cfg['influxdb']['output_measurement_name'],
-             'fields': {'Output01': output_state[0],
-                        'Output02': output_state[1],
-                        'Output03': output_state[2],
-                        'Output04': output_state[3],
-                        'Output05': output_state[4],
-                        'Output06': output_state[5],
-                        'Output07': output_state[6],
-                        'Output08': output_state[7],
-                        'Output09': output_state[8],
-                        'Output10': output_state[9],
-                        'Output11': output_state[10],
-                        'Output12': output_state[11],
-                        'Output13': output_state[12]},
-             'timestamp': round(time.time() * 1000)}
-        )
-        self.buffer.add_point(data_point_level)
+        self.buffer.add_point(Point(self._output_series, round(self.clock.time() * 1000), tuple(output_state)))
+
+        # Publish the status once per data collection cycle
+        self.publish_status(output_state)
+
+    def publish_status(self, output_state=None):
+        """
+        This method publishes an immutable snapshot of the current status, which is served to the frontend without
+        accessing the hardware
+        :param output_state: list of output states, by default read from the shadow register
+        :return:
+        """
+        if output_state is None:
+            output_state = self.get_gpio_state()
+        values = {
+            "status_edge_node": self.running,
+            "mode_auto": self.mode_auto,
+            "mode_manual": self.mode_manual,
+            "auto_mode_requested": self.auto_mode_requested,
+            "consumption_level": self.consumption_level,
+            "load": self.load,
+            "voltage_value": self.voltage_value,
+            "voltage_average": self.voltage_average,
+            "phase": self.regime_str,
+        }
+        for i, state in enumerate(output_state):
+            values["output" + str(i + 1)] = state
+        snapshot = StatusSnapshot(values, self.clock.time())
+
+        # Subscribers are woken up only if the status changed
+        if self.status is not None and snapshot.etag == self.status.etag:
+            return
+        with self._status_changed:
+            self.status = snapshot
+            self._status_changed.notify_all()
+
+    def get_status(self):
+        """
+        This method returns the latest status snapshot
+        :return:
+        """
+        return self.status
+
+    def wait_for_status(self, previous, timeout=None):
+        """
+        This method waits until a status snapshot other than the given one is published
+        :param previous: last known status snapshot
+        :param timeout: maximal waiting time in seconds
+        :return: latest status snapshot
+        """
+        with self._status_changed:
+            self._status_changed.wait_for(lambda: self.status is not previous, timeout)
+            return self.status
 
     def switch_to_auto_mode(self):
         log_event(self.cfg, self.module_name, '', 'INFO', 'Changing mode to automatic...')
@@ -340,7 +376,7 @@ class EdgeNode:
         self.mode_auto = True
         self.mode_manual = False
         log_event(self.cfg, self.module_name, '', 'INFO', 'Mode changed to automatic')
-        self._write_mode()
+        self._data_collection_mode()
 
     def switch_to_manual_mode(self):
         log_event(self.cfg, self.module_name, '', 'INFO', 'Changing mode to manual...')
@@ -354,39 +390,39 @@ class EdgeNode:
 
     def _data_collection_mode(self):
         # Write mode change in influxdb
-        data_point = BufferEntity(
-            {'measurement': self.cfg['influxdb']['mode_measurement_name'],
-             'fields': {'Value': int(self.mode_auto)},
-             'timestamp': round(time.time() * 1000)}
-        )
-        self.buffer.add_point(data_point)
+        self.buffer.add_point(Point(self._mode_series, round(self.clock.time() * 1000), (int(self.mode_auto),)))
+        self.publish_status()
 
     def get_consumption_level(self):
         return self.consumption_level
 
     def get_gpio_state(self):
-        output_state = []
-        for channel in self.cfg['gpio']['relays_outputs']['channels']:
-            #state = True
-            state = self.gpio_interface.check_gpio_state(channel, False)
-            output_state.append(state)
-        return output_state
+        # Output states are read from the shadow register of the gpio interface
+        return self.gpio_interface.get_output_states(self.cfg['gpio']['relays_outputs']['channels'])
 
     def set_gpio_state(self, output_no, state):
         channel = self.cfg['gpio']['relays_outputs']['channels'][output_no]
-        self.gpio_interface.write_gpio('gpio', channel, state)
-        log_event(self.cfg, self.module_name, '', 'INFO', 'Channel ' + str(channel) + ' set to ' + str(state))
+        if self.gpio_interface.check_gpio_state(channel, not state):
+            self.relay_switches.inc()
+        self.gpio_interface.write_gpio(channel, state)
+        if state:
+            self._relay_mask |= 1 << output_no
+        else:
+            self._relay_mask &= ~(1 << output_no)
+        log_event(self.cfg, self.module_name, '', 'INFO', 'Channel %s set to %s', channel, state)
+        self.publish_status()
 
     def stop_control(self):
         """
-        This methods initiates the control thread stop
+        This methods stops the control and waits until the running control step is completed
         :return:
         """
-        self._stop_control = True
-        self._set_consumption_level(-1)
         log_event(self.cfg, self.module_name, '', 'WARN', 'Control stop initialised')
-        while not self._stopped_control:
-            pass
+        if self.runtime is not None:
+            self.runtime.stop_control()
+        else:
+            self._control_scheduler.stop()
+        self._set_consumption_level(-1)
         log_event(self.cfg, self.module_name, '', 'WARN', 'Control stopped')
 
     def stop_data_collection(self):
@@ -394,15 +430,33 @@ class EdgeNode:
         This methods initiates the data collection thread stop
         :return:
         """
-        self._stop_data_collection = True
+        self._sampling_scheduler.stop(wait=False)
         log_event(self.cfg, self.module_name, '', 'INFO', 'Data collection stop initialised')
 
     def stop(self):
         """
-        This method initiates stopping both control and data collection threads
+        This method stops both control and data collection and waits for their completion
         :return:
         """
         self.stop_control()
-        self.stop_data_collection()
-        while not (self._stopped_control and self._stopped_data_collection):
-            time.sleep(1)
+        if self.runtime is not None:
+            self.runtime.stop()
+        else:
+            self.stop_data_collection()
+            self._sampling_scheduler.stop()
+        self.running = False
+        self.publish_status()
+
+        # Emit points of open aggregation windows
+        self.buffer.flush()
+        if isinstance(self.buffer, PipelineStage):
+            log_event(self.cfg, self.module_name, '', 'INFO', 'Pipeline statistics: %s', self.buffer.get_statistics())
+        log_event(self.cfg, self.module_name, '', 'INFO', 'Sampling statistics: %s', self.get_sampling_statistics())
+
+    def get_sampling_statistics(self):
+        """
+        This method returns jitter and overrun statistics of sampling and control channels
+        :return: dict of channel name and statistics (times in ms)
+        """
+        return {channel.name: channel.statistics.as_dict()
+                for channel in self.sampling_channels + [self.control_channel]}
@@ -1,24 +1,280 @@
+import atexit
+import json
+import queue
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 
+LEVELS = {'DEBUG': 0, 'INFO': 1, 'WARN': 2, 'ERR': 3}
 
-def log_event(cfg, module, event, type, text_message):
-    output_threshold = cfg['event_logger']['print_level']
-    if output_threshold == 'DEBUG':
-        print(compose_msg(module, type, text_message))
-    elif output_threshold == 'INFO' and type in ['INFO', 'WARN', 'ERR']:
-        print(compose_msg(module, type, text_message))
-    elif output_threshold == 'WARN' and type in ['WARN', 'ERR']:
-        print(compose_msg(module, type, text_message))
-    elif output_threshold == 'ERR' and type in ['ERR']:
-        print(compose_msg(module, type, text_message))
+# Maximal number of records waiting for the background writer, further records are dropped and counted
+MAX_QUEUED_RECORDS = 10000
+# Maximal number of messages, whose rate limiting state is kept, the least recently emitted ones are forgotten
+MAX_RATE_LIMITED_MESSAGES = 1024
 
-    if cfg['event_logger']['publish']:
-        publish_event(event)
 
+class _RecordWriter:
+    """
+    Background thread shared by all event loggers of the process, which writes their enqueued records
+    """
 
-def compose_msg(module, type, text_message):
+    def __init__(self):
+        # Records waiting for the writer and number of records dropped as the queue was full
+        self.queue = queue.Queue(MAX_QUEUED_RECORDS)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._write_records, name='EventLogger', daemon=True)
+        self._thread.start()
+
+    def put(self, record):
+        """
+        This function enqueues a record without blocking
+        :param record: tuple of event logger, timestamp, module, event, type, level, message, args and number of
+        suppressed records
+        :return:
+        """
+        try:
+            self.queue.put_nowait(record + (self.dropped,))
+            self.dropped = 0
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=1.0):
+        """
+        This function waits until all enqueued records are written
+        :param timeout: maximal waiting time in seconds
+        :return:
+        """
+        done = threading.Event()
+        try:
+            self.queue.put(done, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def _write_records(self):
+        """
+        This function writes enqueued records by their event loggers
+        :return:
+        """
+        while True:
+            record = self.queue.get()
+            if isinstance(record, threading.Event):
+                sys.stdout.flush()
+                record.set()
+                continue
+            record[0].write_record(*record[1:])
+
+
+class EventLogger:
+    """
+    Event logger with the threshold resolved once from the configuration. Records are filtered in the calling thread,
+    messages are formatted lazily and written by the background thread shared by all loggers, so that logging does not
+    block the hot path.
+    """
+
+    def __init__(self, cfg):
+        """
+        Initialisation
+        :param cfg: Set of parameters including print level, rate limit and publishing target
+        """
+        logger_cfg = cfg['event_logger']
+        self.cfg = cfg
+        self.rate_limit = logger_cfg.get('rate_limit', 0) or 0
+        self.publish = bool(logger_cfg.get('publish', False))
+        self.print_threshold = LEVELS.get(logger_cfg.get('print_level', 'INFO'), LEVELS['INFO'])
+        self.publish_threshold = LEVELS.get(logger_cfg.get('publish_level', 'INFO'), LEVELS['INFO'])
+        self.threshold = min(self.print_threshold, self.publish_threshold) if self.publish else self.print_threshold
+        self._publisher = EventPublisher(logger_cfg.get('publish_target', 'file:events.log')) if self.publish else None
+
+        # Rate limiting per message format: time of the last emitted record and number of suppressed records,
+        # ordered from the least to the most recently emitted message
+        self._rate_state = OrderedDict()
+        self._rate_lock = threading.Lock()
+
+    def log(self, module, event, type, text_message, args=()):
+        """
+        This function enqueues a record for the background writer. The message is formatted with args only if the
+        record is emitted. Messages with the same format string are rate-limited together, so call sites should pass
+        variable parts as args.
+        :param module: module name
+        :param event: event identifier
+        :param type: record type (DEBUG, INFO, WARN or ERR)
+        :param text_message: message or %-format string
+        :param args: arguments of the format string
+        :return:
+        """
+        level = LEVELS.get(type, LEVELS['ERR'])
+        if level < self.threshold:
+            return
+
+        suppressed = 0
+        if self.rate_limit:
+            key = (module, text_message)
+            now = time.time()
+            with self._rate_lock:
+                state = self._rate_state.get(key)
+                if state is not None and now - state[0] < self.rate_limit:
+                    state[1] += 1
+                    return
+                if state is not None:
+                    suppressed = state[1]
+                self._rate_state[key] = [now, 0]
+                self._rate_state.move_to_end(key)
+                if len(self._rate_state) > MAX_RATE_LIMITED_MESSAGES:
+                    self._rate_state.popitem(last=False)
+
+        _get_writer().put((self, time.time(), module, event, type, level, text_message, args, suppressed))
+
+    def write_record(self, timestamp, module, event, type, level, text_message, args, suppressed, dropped):
+        """
+        This function writes a record to stdout and the publishing target. It is executed by the background thread.
+        :param timestamp: time of the record in s
+        :param module: module name
+        :param event: event identifier
+        :param type: record type (DEBUG, INFO, WARN or ERR)
+        :param level: numeric level of the type
+        :param text_message: message or %-format string
+        :param args: arguments of the format string
+        :param suppressed: number of similar records suppressed by rate limiting before this one
+        :param dropped: number of records of any logger dropped due to the full queue before this one
+        :return:
+        """
+        try:
+            if args:
+                text_message = text_message % args
+            if suppressed:
+                text_message += ' (' + str(suppressed) + ' similar message(s) suppressed)'
+            if dropped:
+                text_message += ' (' + str(dropped) + ' message(s) dropped, logger queue full)'
+            if level >= self.print_threshold:
+                print(compose_msg(module, type, text_message, datetime.fromtimestamp(timestamp)))
+            if self._publisher and level >= self.publish_threshold:
+                self._publisher.publish_event({'time': timestamp, 'module': module, 'event': event,
+                                               'type': type, 'message': text_message})
+        except Exception as err:
+            print(compose_msg('Logger', 'ERR', 'Cannot write event: ' + str(err)))
+
+
+class EventPublisher:
+    """
+    Sink publishing events as JSON lines either to a local file (file:<path>) or to a UDP socket (udp://<host>:<port>)
+    """
+
+    def __init__(self, target):
+        """
+        Initialisation
+        :param target: publishing target
+        """
+        self.target = target
+        self._file = None
+        self._socket = None
+        self._address = None
+        if target.startswith('udp://'):
+            host, port = target[len('udp://'):].rsplit(':', 1)
+            self._address = (host, int(port))
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        else:
+            path = target[len('file:'):] if target.startswith('file:') else target
+            self._file = open(path, 'a', buffering=1)
+
+    def publish_event(self, event):
+        """
+        This function publishes a single event
+        :param event: dict describing the event
+        :return:
+        """
+        data = json.dumps(event)
+        if self._socket is not None:
+            self._socket.sendto(data.encode('utf-8'), self._address)
+        else:
+            self._file.write(data + '\n')
+
+
+# Loggers by the values of the event logger parameters, so that copies of a configuration share a logger. Lookups
+# by configuration object are cached, an entry is valid as long as the configuration holds the same parameters object.
+_loggers = {}
+_loggers_by_cfg = {}
+_loggers_lock = threading.Lock()
+MAX_CACHED_CONFIGURATIONS = 256
+
+# Background writer shared by all loggers, started with the first record
+_writer = None
+
+
+def _get_writer():
+    """
+    This function returns the background writer and starts it if required
+    :return: record writer
+    """
+    global _writer
+    if _writer is None:
+        with _loggers_lock:
+            if _writer is None:
+                _writer = _RecordWriter()
+    return _writer
+
+
+def get_logger(cfg):
+    """
+    This function returns the event logger of the given configuration and creates it if required
+    :param cfg: Set of parameters including event logger parameters
+    :return: event logger
+    """
+    logger_cfg = cfg['event_logger']
+    cached = _loggers_by_cfg.get(id(cfg))
+    if cached is not None and cached[0] is logger_cfg:
+        return cached[1]
+    key = tuple(sorted((name, repr(value)) for name, value in logger_cfg.items()))
+    with _loggers_lock:
+        logger = _loggers.get(key)
+        if logger is None:
+            logger = EventLogger(cfg)
+            _loggers[key] = logger
+        if len(_loggers_by_cfg) >= MAX_CACHED_CONFIGURATIONS:
+            _loggers_by_cfg.clear()
+        _loggers_by_cfg[id(cfg)] = (logger_cfg, logger)
+    return logger
+
+
+def log_event(cfg, module, event, type, text_message, *args):
+    """
+    This function logs an event. Message arguments are applied lazily, i.e. only if the record passes the threshold:
+    log_event(cfg, 'Buffer', '', 'INFO', 'Point copied into buffer (size=%d)', size)
+    :param cfg: Set of parameters including event logger parameters
+    :param module: module name
+    :param event: event identifier
+    :param type: record type (DEBUG, INFO, WARN or ERR)
+    :param text_message: message or %-format string
+    :param args: arguments of the format string
+    :return:
+    """
+    cached = _loggers_by_cfg.get(id(cfg))
+    if cached is not None and cached[0] is cfg['event_logger']:
+        logger = cached[1]
+    else:
+        logger = get_logger(cfg)
+    logger.log(module, event, type, text_message, args)
+
+
+def flush_events(timeout=1.0):
+    """
+    This function waits until all loggers have written their enqueued records
+    :param timeout: maximal waiting time in seconds
+    :return:
+    """
+    if _writer is not None:
+        _writer.flush(timeout)
+
+
+atexit.register(flush_events)
+
+
+def compose_msg(module, type, text_message, timestamp=None):
     msg_str = ''
-    msg_str += str(datetime.now())
+    msg_str += str(timestamp or datetime.now())
     msg_str += ' ['+module+']'
     msg_str += get_color(type) + '[' + type + '] ' + '\033[0m'
     msg_str += text_message
@@ -34,7 +290,3 @@ def get_color(type):
         return '\033[91m'
     else:
         return '\033[0m'
-
-
-def publish_event(event):
-    pass
\ No newline at end of file
@@ -1,15 +1,22 @@
-from flask import Flask, jsonify, render_template
+from flask import Flask, Response, render_template, request, stream_with_context
+import json
 import threading
 import time
 from random import randint
+from src.metrics import metrics_registry
+from src.status import StatusSnapshot
 
 class Frontend:
-    def __init__(self, host, port, edge_node_obj, idb_obj):
+    def __init__(self, host, port, edge_node_obj, idb_obj, stream_keepalive=5):
         self.host = host
         self.port = port
         self.edge_node_obj = edge_node_obj
         self.idb_obj = idb_obj
         self.app = None
+        # Status snapshot including the INFLUXDB connection status cached per status snapshot of the edge node
+        self._info = None
+        # Interval of keep-alive comments and INFLUXDB connection status checks of status streams in s
+        self.stream_keepalive = stream_keepalive
 
     def start(self):
         # Initialise flask app
@@ -19,33 +26,22 @@ class Frontend:
         edge_node_obj = self.edge_node_obj
         idb_obj = self.idb_obj
 
+        def get_info():
+            """
+            This function returns the status snapshot served by /api/info, whose JSON body and ETag are computed once
+            per published status snapshot, so that the cost of a request does not depend on the number of viewers.
+            """
+            snapshot = edge_node_obj.get_status()
+            connection_status = bool(idb_obj.connection_status)
+            info = self._info
+            if info is None or info[0] is not snapshot or info[1] != connection_status:
+                info = (snapshot, connection_status,
+                        StatusSnapshot(dict(snapshot.values, status_influxdb=connection_status), snapshot.timestamp))
+                self._info = info
+            return info[2]
+
         def get_values():
-            output_states = edge_node_obj.get_gpio_state()
-            return {
-                "status_edge_node": edge_node_obj.running,
-                "status_influxdb": idb_obj.connection_status,
-                "mode_auto": edge_node_obj.mode_auto,
-                "mode_manual": edge_node_obj.mode_manual,
-                "auto_mode_requested": edge_node_obj.auto_mode_requested,
-                "consumption_level": edge_node_obj.consumption_level,
-                "load": edge_node_obj.load,
-                "voltage_value": edge_node_obj.voltage_value,
-                "voltage_average": edge_node_obj.voltage_average,
-                "phase": edge_node_obj.regime_str,
-                "output1": output_states[0],
-                "output2": output_states[1],
-                "output3": output_states[2],
-                "output4": output_states[3],
-                "output5": output_states[4],
-                "output6": output_states[5],
-                "output7": output_states[6],
-                "output8": output_states[7],
-                "output9": output_states[8],
-                "output10": output_states[9],
-                "output11": output_states[10],
-                "output12": output_states[11],
-                "output13": output_states[12]
-            }
+            return get_info().values
 
         # Main page
         @app.route("/")
@@ -54,7 +50,34 @@ class Frontend:
 
         @app.route("/api/info")
         def send_and_receive_info():
-            return jsonify(get_values())
+            info = get_info()
+            response = Response(info.body, mimetype='application/json')
+            response.set_etag(info.etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response.make_conditional(request)
+
+        @app.route("/api/stream")
+        def stream_info():
+            def events():
+                # The first event carries all values, further events only the changed ones
+                sent = {}
+                snapshot = None
+                while True:
+                    snapshot = edge_node_obj.wait_for_status(snapshot, self.stream_keepalive)
+                    info = get_info()
+                    delta = {key: value for key, value in info.values.items() if key not in sent or sent[key] != value}
+                    if delta:
+                        sent = info.values
+                        yield 'id: ' + info.etag + '\ndata: ' + json.dumps(delta) + '\n\n'
+                    else:
+                        yield ': keep-alive\n\n'
+
+            return Response(stream_with_context(events()), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+        @app.route('/metrics')
+        def metrics():
+            return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
 
         @app.route('/Emergency')
         def emergency():
@@ -86,5 +109,5 @@ class Frontend:
             edge_node_obj.switch_to_manual_mode()
             return "Nothing"
 
-        _thread = threading.Thread(target=app.run, kwargs={'host': self.host, 'port': self.port})
+        _thread = threading.Thread(target=app.run, kwargs={'host': self.host, 'port': self.port, 'threaded': True})
         _thread.start()
@@ -1,22 +1,91 @@
 import time
-from random import randint
-from src.input_simulator import InputSimulator
-import board
-import busio
-import adafruit_ads1x15.ads1015 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
-import RPi.GPIO as GPIO
+from src.event_logger import log_event
+from src.hal import create_backend
+from src.metrics import metrics_registry
+
 
 class GPIODataReaderWriter:
-    def __init__(self, deploy=False):
-        self.deploy = deploy
-        if deploy:
-            self.i2c = busio.I2C(board.SCL, board.SDA)
-            GPIO.setmode(GPIO.BCM)
-            GPIO.setwarnings(False)
-            self.ads = ADS.ADS1015(self.i2c)
-        self.gpio = [None] * 40
-        self.voltage_simulator = InputSimulator(55, 'constant')
+    def __init__(self, cfg, backend=None):
+        """
+        Initialisation
+        :param cfg: Set of parameters including simulation, ADC and HAL parameters
+        :param backend: hardware backend, by default the configured one
+        """
+        self.module_name = 'GPIO'
+        self.cfg = cfg
+        self.backend = backend if backend is not None else create_backend(cfg)
+        # Pin modes are set up once per channel, output states are cached in a shadow register (True = switched on)
+        self._output_channels = set()
+        self._input_channels = set()
+        self._shadow = {}
+        self.i2c_read_duration = metrics_registry.histogram('gpio_i2c_read_duration_seconds',
+                                                            'Duration of ADC reads over I2C')
+
+    def configure_outputs(self, channels, initial_state=False):
+        """
+        This function sets up output channels once and initialises them and the shadow register
+        :param channels: list of output channels
+        :param initial_state: initial output state
+        :return:
+        """
+        channels = [channel for channel in channels if channel not in self._output_channels]
+        if not channels:
+            return
+        self.backend.setup_outputs(channels, initial_state)
+        self._output_channels.update(channels)
+        self._input_channels.difference_update(channels)
+        for channel in channels:
+            self._shadow[channel] = initial_state
+
+    def configure_inputs(self, channels):
+        """
+        This function sets up input channels once
+        :param channels: list of input channels
+        :return:
+        """
+        channels = [channel for channel in channels if channel not in self._input_channels]
+        if not channels:
+            return
+        self.backend.setup_inputs(channels)
+        self._input_channels.update(channels)
+        self._output_channels.difference_update(channels)
+        for channel in channels:
+            self._shadow.pop(channel, None)
+
+    def write_many(self, states):
+        """
+        This function writes several output channels at once and updates the shadow register
+        :param states: dict of channel and desired state
+        :return: write status
+        """
+        if not states:
+            return True
+        self.configure_outputs(list(states))
+        self.backend.output(states)
+        self._shadow.update(states)
+        log_event(self.cfg, self.module_name, '', 'DEBUG', 'Wrote %s', states)
+        return True
+
+    def read_many(self, channels):
+        """
+        This function reads several input channels
+        :param channels: list of input channels
+        :return: bitmask, bit n is set if channels[n] is high
+        """
+        self.configure_inputs(channels)
+        mask = 0
+        for n, channel in enumerate(channels):
+            if self.backend.input(channel):
+                mask |= 1 << n
+        return mask
+
+    def get_output_states(self, channels):
+        """
+        This function returns the output states from the shadow register without hardware access
+        :param channels: list of output channels
+        :return: list of states
+        """
+        return [self._shadow.get(channel, False) for channel in channels]
 
     def read_value(self, access_type, access_data):
         if access_type == 'i2c':
@@ -27,71 +96,55 @@ class GPIODataReaderWriter:
             read_value = None
         return read_value
 
+    def _read_analog(self, channel_no, scale_min, scale_max):
+        """
+        This function reads a scaled ADC input and records the duration of the read
+        :param channel_no: ADC channel
+        :param scale_min: value at the lower end of the input range
+        :param scale_max: value at the upper end of the input range
+        :return: scaled value
+        """
+        started = time.perf_counter()
+        read_value = self.backend.read_analog(channel_no, scale_min, scale_max)
+        self.i2c_read_duration.observe(time.perf_counter() - started)
+        return read_value
+
+    def read_scan(self, access_data_list):
+        """
+        This function reads several ADC inputs in one pass of the backend and records the duration of the scan
+        :param access_data_list: list of input descriptions with channel, scale_min and scale_max
+        :return: list of scaled values
+        """
+        inputs = [(access_data.get('channel', 0), access_data['scale_min'], access_data['scale_max'])
+                  for access_data in access_data_list]
+        started = time.perf_counter()
+        read_values = self.backend.read_analog_many(inputs)
+        self.i2c_read_duration.observe(time.perf_counter() - started)
+        log_event(self.cfg, self.module_name, '', 'DEBUG', 'Scanned %s', read_values)
+        return read_values
+
     def _read_i2c(self, access_data):
-        read_value = None
-        scale_min = access_data['scale_min']
-        scale_max = access_data['scale_max']
-        if self.deploy:
-            analog_input = AnalogIn(self.ads, ADS.P0)
-            if analog_input:
-                read_value = scale_min + analog_input.value * (scale_max-scale_min)/32752.0 - 2.2
-            else:
-                read_value = 0
-        else:
-            raw_value = self.voltage_simulator.get_raw_value()
-            read_value = self.voltage_simulator.value
-            print('Read simulated value ', read_value, ' raw value = ', raw_value)
+        read_value = self._read_analog(access_data.get('channel', 0), access_data['scale_min'], access_data['scale_max'])
+        log_event(self.cfg, self.module_name, '', 'DEBUG', 'Read %s', read_value)
         return read_value
-    
-    def _read_gpio(self, canal):
-        if self.deploy:
-            GPIO.setup(channel, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
-            read_value = GPIO.input(canal)
-        else:
-            read_value = True
-        print('Read ', read_value, ' in channel ', channel)
+
+    def _read_gpio(self, channel):
+        read_value = bool(self.read_many([channel]))
+        log_event(self.cfg, self.module_name, '', 'DEBUG', 'Read %s in channel %s', read_value, channel)
         return read_value
 
     def write_gpio(self, channel, value):
-        if self.deploy:
-            GPIO.setup(channel, GPIO.OUT)
-            if value:
-                state = GPIO.LOW
-            else:
-                state = GPIO.HIGH
-            GPIO.output(channel, state)
-        else:
-            self.gpio[channel] = value
-        print('Wrote ', value, ' in channel ', channel)
-        write_status = True
-        return write_status
+        return self.write_many({channel: value})
 
     def _write_i2c(self, access_data, value):
         channel_no = access_data['channel_no']
         scale_min = access_data['scale_min']
         scale_max = access_data['scale_max']
-        if self.deploy:
-            ads = ADS.ADS1015(self.i2c)
-            if channel_no == 0:
-                analog_input = AnalogIn(ads, ADS.P0)
-            if analog_input:
-                read_value = scale_min + analog_input.value * (scale_max - scale_min) / 2 ** 15
-            else:
-                read_value = None
-            print('Read ', read_value, ' from channel ', channel_no, ' raw value = ', analog_input.value)
-        else:
-            raw_value = self.voltage_simulator.get_raw_value()
-            read_value = self.voltage_simulator.value
-            print('Read simulated value ', read_value, ' from channel ', channel_no, ' raw value = ', raw_value)
+        raw_value = self.backend.read_adc(channel_no)
+        read_value = scale_min + raw_value * (scale_max - scale_min) / 2 ** 15
+        log_event(self.cfg, self.module_name, '', 'DEBUG', 'Read %s from channel %s raw value = %s',
+                  read_value, channel_no, raw_value)
         return read_value
 
     def check_gpio_state(self, channel, value):
-        if self.deploy:
-            if value:
-                state = GPIO.LOW
-            else:
-                state = GPIO.HIGH
-            current_state = GPIO.input(channel)
-        else:
-            current_state = self.gpio[channel]
-        return current_state == value
+        return self._shadow.get(channel, False) == value
@@ -0,0 +1,208 @@
+"""
+Hardware abstraction layer: backends provide digital outputs and inputs and analog inputs to GPIODataReaderWriter.
+Backends are loaded lazily by name, so that hardware libraries are imported only if the hardware is used.
+"""
+import importlib
+from src.input_simulator import InputSimulator
+
+
+class RPiBackend:
+    """
+    Backend accessing the Raspberry Pi GPIO and an ADS1015 ADC via I2C. Relays are active low.
+    """
+
+    def __init__(self, cfg):
+        """
+        Initialisation
+        :param cfg: Set of parameters including ADC parameters: address, gain, mode (single or continuous) and
+        data_rate (samples/s)
+        """
+        adc_cfg = cfg['gpio'].get('adc') or {}
+        board = importlib.import_module('board')
+        busio = importlib.import_module('busio')
+        self.GPIO = importlib.import_module('RPi.GPIO')
+        self.ADS = importlib.import_module('adafruit_ads1x15.ads1015')
+        self.AnalogIn = importlib.import_module('adafruit_ads1x15.analog_in').AnalogIn
+        Mode = importlib.import_module('adafruit_ads1x15.ads1x15').Mode
+
+        self.i2c = busio.I2C(board.SCL, board.SDA)
+        self.GPIO.setmode(self.GPIO.BCM)
+        self.GPIO.setwarnings(False)
+        # In continuous mode, the ADC converts permanently and repeated reads of the same input return the latest
+        # conversion without triggering and awaiting a new one
+        self.ads = self.ADS.ADS1015(self.i2c, gain=adc_cfg.get('gain', 1), data_rate=adc_cfg.get('data_rate'),
+                                    mode=Mode.CONTINUOUS if adc_cfg.get('mode') == 'continuous' else Mode.SINGLE,
+                                    address=adc_cfg.get('address', 0x48))
+        # Analog inputs are created once per ADC channel
+        self._analog_inputs = {}
+
+    def setup_outputs(self, channels, initial_state):
+        self.GPIO.setup(channels, self.GPIO.OUT, initial=self.GPIO.LOW if initial_state else self.GPIO.HIGH)
+
+    def setup_inputs(self, channels):
+        self.GPIO.setup(channels, self.GPIO.IN, pull_up_down=self.GPIO.PUD_DOWN)
+
+    def output(self, states):
+        """
+        This function writes several outputs in one call
+        :param states: dict of channel and desired state (True = switched on)
+        :return:
+        """
+        self.GPIO.output(list(states), [self.GPIO.LOW if value else self.GPIO.HIGH for value in states.values()])
+
+    def input(self, channel):
+        return bool(self.GPIO.input(channel))
+
+    def _analog_input(self, channel_no):
+        """
+        This function returns the persistent analog input of an ADC channel
+        :param channel_no: ADC channel (0..3)
+        :return: analog input
+        """
+        analog_input = self._analog_inputs.get(channel_no)
+        if analog_input is None:
+            analog_input = self.AnalogIn(self.ads, (self.ADS.P0, self.ADS.P1, self.ADS.P2, self.ADS.P3)[channel_no])
+            self._analog_inputs[channel_no] = analog_input
+        return analog_input
+
+    def read_adc(self, channel_no):
+        """
+        This function reads the raw value of an ADC channel
+        :param channel_no: ADC channel (0..3)
+        :return: raw value
+        """
+        return self._analog_input(channel_no).value
+
+    def read_adc_many(self, channel_nos):
+        """
+        This function reads the raw values of several ADC channels in one pass. The persistent analog inputs are read
+        back to back, in continuous mode each read returns the latest conversion of the channel.
+        :param channel_nos: list of ADC channels (0..3)
+        :return: list of raw values
+        """
+        analog_inputs = [self._analog_input(channel_no) for channel_no in channel_nos]
+        return [analog_input.value for analog_input in analog_inputs]
+
+    @staticmethod
+    def _scale(raw_value, scale_min, scale_max):
+        """
+        This function scales a raw ADC value
+        :param raw_value: raw value
+        :param scale_min: value at the lower end of the range
+        :param scale_max: value at the upper end of the range
+        :return: scaled value
+        """
+        return scale_min + raw_value * (scale_max - scale_min) / 32752.0 - 2.2
+
+    def read_analog(self, channel_no, scale_min, scale_max):
+        """
+        This function reads an ADC channel and scales the value
+        :param channel_no: ADC channel (0..3)
+        :param scale_min: value at the lower end of the range
+        :param scale_max: value at the upper end of the range
+        :return: scaled value
+        """
+        return self._scale(self.read_adc(channel_no), scale_min, scale_max)
+
+    def read_analog_many(self, inputs):
+        """
+        This function reads several analog inputs in one pass. Inputs of the same channel are read once.
+        :param inputs: list of tuples with ADC channel, scale_min and scale_max
+        :return: list of scaled values
+        """
+        channel_nos = list(dict.fromkeys(channel_no for channel_no, _, _ in inputs))
+        raw_values = dict(zip(channel_nos, self.read_adc_many(channel_nos)))
+        return [self._scale(raw_values[channel_no], scale_min, scale_max) for channel_no, scale_min, scale_max in inputs]
+
+
+class SimulatedBackend:
+    """
+    In-process backend: outputs are kept in memory, digital inputs return configured states and analog inputs are
+    generated by an input simulator per ADC channel. Backends are independent, so that many virtual edge nodes can run
+    in one process.
+    """
+
+    def __init__(self, cfg):
+        """
+        Initialisation
+        :param cfg: Set of parameters including simulation parameters: profile, initial_value, seed, trace_file and
+        inputs (dict of channel and state)
+        """
+        simulation_cfg = cfg.get('simulation') or {}
+        self.profile = simulation_cfg.get('profile', 'constant')
+        self.initial_value = simulation_cfg.get('initial_value', 55)
+        self.seed = simulation_cfg.get('seed')
+        self.trace_file = simulation_cfg.get('trace_file')
+        self.inputs = dict(simulation_cfg.get('inputs') or {})
+        self.outputs = {}
+        self.simulators = {}
+        # Number of output state changes, i.e. relay switching operations
+        self.switches = 0
+
+    def setup_outputs(self, channels, initial_state):
+        for channel in channels:
+            self.outputs[channel] = initial_state
+
+    def setup_inputs(self, channels):
+        pass
+
+    def output(self, states):
+        for channel, value in states.items():
+            if self.outputs.get(channel) != value:
+                self.switches += 1
+                self.outputs[channel] = value
+
+    def input(self, channel):
+        return bool(self.inputs.get(channel, True))
+
+    def simulator(self, channel_no):
+        """
+        This function returns the input simulator of an ADC channel
+        :param channel_no: ADC channel
+        :return: input simulator
+        """
+        simulator = self.simulators.get(channel_no)
+        if simulator is None:
+            simulator = InputSimulator(self.initial_value, self.profile, seed=self.seed, trace_file=self.trace_file)
+            self.simulators[channel_no] = simulator
+        return simulator
+
+    def read_adc(self, channel_no):
+        return self.simulator(channel_no).get_raw_value()
+
+    def read_analog(self, channel_no, scale_min, scale_max):
+        return self.simulator(channel_no).get_voltage_value()
+
+    def read_analog_many(self, inputs):
+        """
+        This function reads several analog inputs in one pass. Inputs of the same channel are read once, i.e. the
+        simulator of the channel advances by a single step.
+        :param inputs: list of tuples with ADC channel, scale_min and scale_max
+        :return: list of values
+        """
+        values = {}
+        for channel_no, _, _ in inputs:
+            if channel_no not in values:
+                values[channel_no] = self.simulator(channel_no).get_voltage_value()
+        return [values[channel_no] for channel_no, _, _ in inputs]
+
+
+BACKENDS = {
+    'rpi': RPiBackend,
+    'simulated': SimulatedBackend,
+}
+
+
+def create_backend(cfg):
+    """
+    This function creates the configured backend. Without explicit configuration, the simulated backend is used if the
+    simulation is active and the Raspberry Pi backend otherwise.
+    :param cfg: Set of parameters
+    :return: backend
+    """
+    name = (cfg.get('hal') or {}).get('backend')
+    if not name:
+        name = 'simulated' if cfg['simulation']['active'] else 'rpi'
+    if name not in BACKENDS:
+        raise ValueError('Unknown HAL backend: ' + str(name))
+    return BACKENDS[name](cfg)
@@ -0,0 +1,139 @@
+import gzip
+import requests
+from requests.adapters import HTTPAdapter
+from influxdb.exceptions import InfluxDBClientError, InfluxDBServerError
+from src.clock import SystemClock
+
+
+class InfluxTransport:
+    """
+    HTTP transport of the INFLUXDB 1.x API on a single persistent session, so that writes, queries and health checks
+    share a pool of keep-alive connections. Line protocol payloads above a size threshold are gzip compressed. Every
+    successful request counts as a health check.
+    """
+
+    def __init__(self, host, port, username=None, password=None, database=None, timeout=10, gzip_threshold=1024,
+                 gzip_level=5, pool_size=2, clock=None):
+        """
+        Initialisation
+        :param host: server host
+        :param port: server port
+        :param username: user name
+        :param password: password
+        :param database: default database
+        :param timeout: request timeout in s
+        :param gzip_threshold: minimal payload size in bytes, which is compressed, 0 disables compression
+        :param gzip_level: compression level (1..9)
+        :param pool_size: maximal number of pooled connections
+        :param clock: clock providing monotonic time, by default the system clock
+        """
+        self.base_url = 'http://' + str(host) + ':' + str(port)
+        self.database = database
+        self.timeout = timeout
+        self.gzip_threshold = gzip_threshold
+        self.gzip_level = gzip_level
+        self.clock = clock if clock is not None else SystemClock()
+
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0))
+        if username:
+            self.session.auth = (username, password)
+
+        # Time of the last successful request (monotonic) and failure of the last request
+        self.last_success = None
+        self.failed = False
+
+        # Transfer statistics
+        self.requests = 0
+        self.payload_bytes = 0
+        self.sent_bytes = 0
+
+    def _request(self, method, path, expected, **kwargs):
+        """
+        This function sends a request and checks the response status
+        :param method: HTTP method
+        :param path: URL path
+        :param expected: expected status code
+        :return: response
+        """
+        self.requests += 1
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException:
+            self.failed = True
+            raise
+        if response.status_code == expected:
+            self.last_success = self.clock.monotonic()
+            self.failed = False
+            return response
+        if 400 <= response.status_code < 500:
+            # The server is reachable, but rejected the request
+            self.last_success = self.clock.monotonic()
+            self.failed = False
+            raise InfluxDBClientError(response.content, response.status_code)
+        self.failed = True
+        raise InfluxDBServerError(response.content)
+
+    def ping(self):
+        """
+        This function checks whether the server is reachable
+        :return: server version
+        """
+        return self._request('GET', '/ping', 204).headers.get('X-Influxdb-Version')
+
+    def seconds_since_success(self):
+        """
+        This function returns the time since the last successful request
+        :return: time in s, None if no request succeeded yet
+        """
+        return None if self.last_success is None else self.clock.monotonic() - self.last_success
+
+    def write(self, data_lines, database=None, precision='ms'):
+        """
+        This function writes lines in line protocol within a single request
+        :param data_lines: list of data lines
+        :param database: database, by default the default database
+        :param precision: timestamp precision
+        :return:
+        """
+        payload = ('\n'.join(data_lines) + '\n').encode('utf-8')
+        headers = {'Content-Type': 'application/octet-stream'}
+        self.payload_bytes += len(payload)
+        if self.gzip_threshold and len(payload) >= self.gzip_threshold:
+            payload = gzip.compress(payload, self.gzip_level)
+            headers['Content-Encoding'] = 'gzip'
+        self.sent_bytes += len(payload)
+        self._request('POST', '/write', 204, data=payload, headers=headers,
+                      params={'db': database or self.database, 'precision': precision})
+
+    def query(self, query, method='GET'):
+        """
+        This function executes a query
+        :param query: InfluxQL query
+        :param method: GET for read-only queries, POST otherwise
+        :return: decoded JSON response
+        """
+        return self._request(method, '/query', 200, params={'q': query}).json()
+
+    def get_list_database(self):
+        """
+        This function lists the databases
+        :return: list of dicts with 'name'
+        """
+        results = self.query('SHOW DATABASES')['results'][0]
+        return [{'name': value[0]} for series in results.get('series', []) for value in series.get('values', [])]
+
+    def create_database(self, database):
+        """
+        This function creates a database
+        :param database: database name
+        :return:
+        """
+        self.query('CREATE DATABASE "' + database.replace('"', '\\"') + '"', method='POST')
+
+    def close(self):
+        """
+        This function closes the pooled connections, the transport remains usable
+        :return:
+        """
+        self.session.close()
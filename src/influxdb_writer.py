@@ -1,62 +1,119 @@
+import sys
 import threading
 import time
-from influxdb import InfluxDBClient
+from influxdb.exceptions import InfluxDBClientError
+from src.connection_state import CircuitBreaker, ExponentialBackoff, StateTimer
 from src.event_logger import log_event
+from src.influx_transport import InfluxTransport
+from src.metrics import metrics_registry
 
 
 class InfluxDBWriter:
     """
     This class represents an OPC UA server and offers necessary functionality to connect to an INFLUX DB server
-    as well as ingest data from buffer
+    as well as ingest data from buffer. Connectivity is a state machine: while disconnected, connection attempts are
+    retried with exponential backoff and jitter, writes pass a circuit breaker and at most one ingestion worker runs.
     """
 
-    def __init__(self, cfg, buffer):
+    # Connection states
+    DISCONNECTED = 'disconnected'
+    CONNECTING = 'connecting'
+    CONNECTED = 'connected'
+    BACKOFF = 'backoff'
+
+    def __init__(self, cfg, buffer, target=None, clock=None):
         """
         Initialisation
         :param cfg: Set of parameters including connection information and data about metrics
         :param buffer: Link to a buffer object, where to save gathered data points
+        :param target: parameters of a mirror target overriding the influxdb parameters, including its name
+        :param clock: clock for health checks and connection state timing, by default the system clock
         """
-        # Module name
-        self.module_name = 'Influx'
-
         # Extraction of configuration parameters relevant for connectivity of the OPC UA server
         self.cfg = cfg
-        self.host = cfg['influxdb']['host']
-        self.port = cfg['influxdb']['port']
-        self.user = cfg['influxdb']['user']
-        self.password = cfg['influxdb']['password']
-        self.db_name = cfg['influxdb']['database']
-        self.db_user = cfg['influxdb']['db_user']
-        self.db_password = cfg['influxdb']['db_password']
-        self.write_interval = cfg['influxdb']['write_interval']
-        self.reconnect_interval = cfg['influxdb']['reconnect_interval']
-
-        # Creation of INFLUXDB client object
-        self.client = None
-
-        # Connectivity variables
+        influxdb_cfg = dict(cfg['influxdb'], **(target or {}))
+        influxdb_cfg.pop('mirrors', None)
+        self.name = influxdb_cfg.get('name', 'primary')
+
+        # Module name
+        self.module_name = 'Influx' if target is None else 'Influx-' + self.name
+
+        self.host = influxdb_cfg['host']
+        self.port = influxdb_cfg['port']
+        self.user = influxdb_cfg['user']
+        self.password = influxdb_cfg['password']
+        self.db_name = influxdb_cfg['database']
+        self.db_user = influxdb_cfg['db_user']
+        self.db_password = influxdb_cfg['db_password']
+        self.write_interval = influxdb_cfg['write_interval']
+        self.reconnect_interval = influxdb_cfg['reconnect_interval']
+        self.batch_size = influxdb_cfg.get('batch_size', 500)
+        self.batch_max_bytes = influxdb_cfg.get('batch_max_bytes', 65536)
+        self.flush_watermark = influxdb_cfg.get('flush_watermark', self.batch_size)
+        self.max_latency = influxdb_cfg.get('max_latency', self.write_interval)
+        self.health_check_interval = influxdb_cfg.get('health_check_interval', 10000)
+
+        # HTTP transport with persistent connections, kept over reconnects
+        self.client = InfluxTransport(host=self.host, port=self.port, username=self.user, password=self.password,
+                                      database=self.db_name, gzip_threshold=influxdb_cfg.get('gzip_threshold', 1024),
+                                      clock=clock)
+
+        # Connectivity variables: the connection state with time spent in each state, the backoff of connection
+        # attempts starting at reconnect_interval and the circuit breaker around writes
         self.connection_status = False
         self._connectivity_thread = []
+        self.state = StateTimer(self.DISCONNECTED, clock)
+        self.backoff = ExponentialBackoff(self.reconnect_interval / 1000,
+                                          influxdb_cfg.get('reconnect_max_interval', 300000) / 1000,
+                                          jitter=influxdb_cfg.get('reconnect_jitter', 0.5))
+        self.breaker = CircuitBreaker(influxdb_cfg.get('breaker_failure_threshold', 3),
+                                      influxdb_cfg.get('breaker_reset_timeout', 30000) / 1000, clock)
 
-        # Ingestion thread
+        # Ingestion thread, the lock guarantees a single ingestion worker
         self._ingestion_thread = []
+        self._ingestion_lock = threading.Lock()
+        self._ingestion_running = False
 
-        # Buffer
+        # Buffer, read with an own cursor, so that every target progresses independently
         self.buffer = buffer
+        self.consumer = buffer.register_consumer(self.name)
 
         # Exit and stop ingestion flags to complete activities
         self._exit = False
+        self._exit_event = threading.Event()
         self._stop_ingest = False
 
+        # Asynchronous runtime, if the writer is driven by an event loop instead of own threads
+        self.runtime = None
+
+        # Metrics per target, backlog and connection state are computed at collection time
+        labels = {'target': self.name}
+        self.write_duration = metrics_registry.histogram('influxdb_write_duration_seconds',
+                                                         'Duration of successful write requests', labels)
+        self.batch_size_histogram = metrics_registry.histogram('influxdb_batch_size_points',
+                                                               'Number of points per successful write request', labels,
+                                                               buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000))
+        self.write_failures = metrics_registry.counter('influxdb_write_failures_total', 'Failed write requests', labels)
+        self.rejected_lines = metrics_registry.counter('influxdb_rejected_lines_total',
+                                                       'Malformed points rejected by the server and dropped', labels)
+        metrics_registry.gauge('influxdb_backlog_points', 'Number of points not yet written', labels) \
+            .set_function(lambda: self.buffer.len(self.consumer))
+        metrics_registry.gauge('influxdb_backlog_age_seconds', 'Age of the oldest point not yet written', labels) \
+            .set_function(self._backlog_age)
+        metrics_registry.gauge('influxdb_connected', 'Connection to the INFLUXDB server', labels) \
+            .set_function(lambda: int(bool(self.connection_status)))
+        for state in (self.DISCONNECTED, self.CONNECTING, self.CONNECTED, self.BACKOFF):
+            metrics_registry.gauge('influxdb_time_in_state_seconds', 'Time spent in each connection state',
+                                   dict(labels, state=state)) \
+                .set_function(lambda state=state: self.state.time_in_state().get(state, 0.0))
+
     def _single_connect(self):
         """
         Single connection to the INFLUXDB server
         :return: True - if connection successfully established and False - if not
         """
         log_event(self.cfg, self.module_name, '', 'INFO',
-                  'Connecting to INFLUXDB server ' + str(self.host) + ':' + str(self.port) + '...')
-        self.client = InfluxDBClient(host=self.host, port=self.port, username=self.user, password=self.password,
-                                     database=self.db_name)
+                  'Connecting to INFLUXDB server %s:%s...', self.host, self.port)
         self._check_connection_status()
         if self.connection_status:
             log_event(self.cfg, self.module_name, '', 'INFO', 'Connection established')
@@ -71,6 +128,9 @@ class InfluxDBWriter:
         Creates separate thread to take care of connectivity
         :return:
         """
+        if self.runtime is not None:
+            self.runtime.start()
+            return
         self._connectivity_thread = threading.Thread(target=self._connectivity)
         self._connectivity_thread.start()
 
@@ -85,7 +145,7 @@ class InfluxDBWriter:
             self.client.ping()
             self.connection_status = True
         except Exception as err:
-            log_event(self.cfg, self.module_name, '', 'WARN', 'No connection to INFLUXDB server' + ': ' + str(err))
+            log_event(self.cfg, self.module_name, '', 'WARN', 'No connection to INFLUXDB server: %s', err)
             self.connection_status = False
 
     def get_connection_status(self):
@@ -97,71 +157,128 @@ class InfluxDBWriter:
             return {'code': self.connection_status, 'status': 'Connected'}
         return {'code': self.connection_status, 'status': 'Disconnected'}
 
+    def get_state_statistics(self):
+        """
+        This function returns the connection state, the time spent in each state, the number of state transitions and
+        the state of the circuit breaker
+        :return: dict
+        """
+        return {'state': self.state.state, 'time_in_state': self.state.time_in_state(),
+                'transitions': self.state.transitions, 'breaker': self.breaker.state, 'breaker_trips': self.breaker.trips,
+                'reconnect_attempts': self.backoff.attempts}
+
+    def _backlog_age(self):
+        """
+        This function returns the age of the oldest point, which has not been written yet
+        :return: age in s, 0 if all points have been written
+        """
+        timestamps = []
+        for buffer_entity in self.buffer.get_heads(self.consumer):
+            res_conversion, data_line = buffer_entity.convert_to_line_protocol()
+            if res_conversion:
+                timestamps.append(int(data_line.rsplit(' ', 1)[1]))
+        if not timestamps:
+            return 0.0
+        return max(time.time() - min(timestamps) / 1000.0, 0.0)
+
+    def _set_state(self, state):
+        """
+        This function changes the connection state
+        :param state: new state
+        :return:
+        """
+        previous = self.state.state
+        duration = self.state.transition(state)
+        if duration is not None:
+            log_event(self.cfg, self.module_name, '', 'INFO', 'Connection state %s -> %s after %.1f s', previous, state,
+                      duration)
+
     def _connectivity(self):
         """
         This function checks connection and reconnect to the INFLUXDB server as required.
         :return:
         """
-        while True:
-            # If exit flag received, we stop the thread
-            if self._exit:
-                self.disconnect()
-                time.sleep(1)
-                break
-
-            # If connection established, we check connection status periodically
-            if self.connection_status:
-                try:
-                    # Request INFLUX DB connection status
-                    self.client.ping()
-
-                except Exception as err:
-                    # In case of missing connection, we do cleanup procedure and wait a little bit to let
-                    # opcua-python close subscription threads
-                    log_event(self.cfg, self.module_name, '', 'WARN', 'No connection to INFLUXDB server' + ': ' + str(err))
-                    self.connection_status = False
-                    self.disconnect()
-                    time.sleep(1)
-
-            # If connection does not exist yet/anymore, we try to establish one
-            else:
-
-                # Try to connect to OPC UA server
-                connected = self._single_connect()
-                # In case of successful connection, start monitoring
-                if connected:
-                    self._start_ingestion()
-                # In case of unsuccessful connection, repeat again after given reconnection interval
-                else:
-                    time.sleep(self.reconnect_interval / 1000)
+        while not self._exit_event.wait(self._connectivity_step()):
+            pass
+        # If exit flag received, we stop the thread
+        self.disconnect()
 
+    def _connectivity_step(self):
+        """
+        This function performs a single connectivity check and reconnects if required
+        :return: time in seconds until the next check
+        """
+        # If connection established, we check connection status periodically. Successful writes count as checks, the
+        # server is pinged only after a failed request or if there has been no successful request for a while.
+        if self.connection_status:
+            idle_time = self.client.seconds_since_success()
+            if not self.client.failed and idle_time is not None and idle_time < self.health_check_interval / 1000:
+                return 0.5
+            try:
+                # Request INFLUX DB connection status
+                self.client.ping()
+            except Exception as err:
+                # In case of missing connection, ingestion is stopped without waiting for the worker and the next
+                # connection attempt is made after the backoff delay
+                log_event(self.cfg, self.module_name, '', 'WARN', 'No connection to INFLUXDB server: %s', err)
+                self.connection_status = False
+                self._stop_ingestion()
+                self._set_state(self.BACKOFF)
+                return self.backoff.next_delay()
             # Wait a little bit until next connection check
-            time.sleep(0.5)
+            return 0.5
+
+        # If connection does not exist yet/anymore, we try to establish one
+        self._set_state(self.CONNECTING)
+        # In case of successful connection, start monitoring
+        if self._single_connect() and self._start_ingestion():
+            self.backoff.reset()
+            self._set_state(self.CONNECTED)
+            return 0.5
+        # In case of unsuccessful connection, repeat again after the backoff delay
+        self.connection_status = False
+        self._set_state(self.BACKOFF)
+        delay = self.backoff.next_delay()
+        log_event(self.cfg, self.module_name, '', 'INFO', 'Next connection attempt in %.1f s', delay)
+        return delay
 
     def disconnect(self):
         """
         This function stop data transfer and disconnect from the INFLUXDB server.
         :return: Success of the disconnection procedure
         """
-        log_event(self.cfg, self.module_name, '', 'INFO', 'Disconnecting from INFLUXDB server ' + self.host + '...')
+        log_event(self.cfg, self.module_name, '', 'INFO', 'Disconnecting from INFLUXDB server %s...', self.host)
         self._stop_ingestion()
-        time.sleep(self.write_interval / 1000.0)
+        if isinstance(self._ingestion_thread, threading.Thread) and \
+                self._ingestion_thread is not threading.current_thread():
+            self._ingestion_thread.join(self.write_interval / 1000.0)
         try:
             self.client.close()
             log_event(self.cfg, self.module_name, '', 'INFO', 'Disconnection successful')
         except Exception as err:
-            log_event(self.cfg, self.module_name, '', 'ERR', 'Disconnection failed' + ': ' + str(err))
+            log_event(self.cfg, self.module_name, '', 'ERR', 'Disconnection failed: %s', err)
+        self.connection_status = False
+        self._set_state(self.DISCONNECTED)
 
     def _start_ingestion(self):
         """
-        This function begins data ingestion within a separate thread
+        This function begins data ingestion within a separate thread. If the worker of a previous connection is still
+        running, it continues instead of a new one being started.
         :return: ingestion status
         """
         res = self._create_db()
         if res:
-            self._stop_ingest = False
+            with self._ingestion_lock:
+                self._stop_ingest = False
+                if self._ingestion_running:
+                    return True
+                self._ingestion_running = True
+            if self.runtime is not None:
+                self.runtime.start_ingestion()
+                return True
             self._ingestion_thread = threading.Thread(target=self._ingest_data)
             self._ingestion_thread.start()
+            return True
         else:
             log_event(self.cfg, self.module_name, '', 'ERR', 'Ingestion failed due to inability to create database')
             return False
@@ -172,6 +289,7 @@ class InfluxDBWriter:
         :return:
         """
         self._stop_ingest = True
+        self.buffer.wake()
 
     def _ingest_data(self):
         """
@@ -180,28 +298,152 @@ class InfluxDBWriter:
            :return:
            """
         while True:
-            start_time = time.time()
-            buffer_snapshot = self.buffer.get_snapshot()
-            buffer_len = len(buffer_snapshot)
-            if buffer_len:
-                log_event(self.cfg, self.module_name, '', 'INFO',
-                          'Ingesting ' + str(buffer_len) + ' elements from buffer into INFLUXDB')
-                original_idx = 0
-                for idx, buffer_entity in enumerate(buffer_snapshot):
-                    res_conversion, data_line = buffer_entity.convert_to_line_protocol()
-                    if res_conversion:
-                        res_write = self._ingest_data_point(data_line)
-                        if res_write and self.buffer.len() != self.buffer.max_buffer_size:
-                            original_idx += original_idx
-                            self.buffer.remove_point(original_idx)
-                    else:
-                        log_event(self.cfg, self.module_name, '', 'ERR', 'Problem with generating line protocol' + ': ' + str(data_line))
-                        self.buffer.remove_point(original_idx)
-                log_event(self.cfg, self.module_name, '', 'INFO',
-                          'Ingestion of ' + str(buffer_len) + ' point(s) took ' + str(time.time() - start_time))
-            if self._stop_ingest:
+            while not self._stop_ingest:
+                if not self._wait_for_flush():
+                    break
+                pending = self.buffer.len(self.consumer)
+                if self._ingest_cycle() < pending:
+                    # Writing failed, the next attempt is made after max_latency or, if the circuit is open, after
+                    # the circuit becomes half-open unless ingestion is stopped
+                    self.buffer.wait_for_data(sys.maxsize, max(self.max_latency / 1000.0, self.breaker.retry_after()),
+                                              lambda: self._stop_ingest, consumer=self.consumer)
+            # The worker exits only if ingestion has not been restarted in the meantime
+            with self._ingestion_lock:
+                if self._stop_ingest:
+                    self._ingestion_running = False
+                    return
+
+    def _wait_for_flush(self):
+        """
+        This function waits until the next flush is due: the buffer reaches the high watermark or the oldest pending
+        point has waited for max_latency, whichever comes first. While the buffer is empty, it waits without timeout.
+        :return: True if a flush is due, False if the ingestion is being stopped
+        """
+        stopping = lambda: self._stop_ingest
+        if not self.buffer.wait_for_data(1, None, stopping, consumer=self.consumer):
+            return False
+        self.buffer.wait_for_data(self.flush_watermark, self.max_latency / 1000.0, stopping, consumer=self.consumer)
+        return not self._stop_ingest
+
+    def _ingest_cycle(self):
+        """
+        This function performs a single ingestion cycle: points, which are in the buffer at the beginning of the cycle,
+        are peeked batch by batch, converted into line protocol and each batch is written within one request
+        :return: number of points removed from the buffer
+        """
+        start_time = time.time()
+        buffer_len = self.buffer.len(self.consumer)
+        if not buffer_len:
+            return 0
+
+        log_event(self.cfg, self.module_name, '', 'INFO', 'Ingesting %d elements from buffer into INFLUXDB', buffer_len)
+        processed = 0
+        while processed < buffer_len:
+            if not self.breaker.allow():
+                log_event(self.cfg, self.module_name, '', 'WARN', 'Circuit open, writes suspended for %.1f s',
+                          self.breaker.retry_after())
+                break
+            seq, buffer_entities = self.buffer.peek_batch(min(self.batch_size, buffer_len - processed), self.consumer)
+            if not buffer_entities:
+                break
+            consumed, data_lines = self._prepare_batch(buffer_entities)
+            done = self._ingest_batch(data_lines) if data_lines else consumed
+            self.buffer.commit(done, seq, self.consumer)
+            processed += done
+            if done < consumed:
+                # Server is not reachable, remaining points stay in the buffer until the next cycle
+                if self.breaker.record_failure():
+                    log_event(self.cfg, self.module_name, '', 'WARN', 'Circuit opened after %d failed write(s)',
+                              self.breaker.failures)
+                break
+            if data_lines:
+                self.breaker.record_success()
+        log_event(self.cfg, self.module_name, '', 'INFO', 'Ingestion of %d/%d point(s) took %f',
+                  processed, buffer_len, time.time() - start_time)
+        return processed
+
+    def _prepare_batch(self, buffer_entities):
+        """
+        This function converts leading buffer entities into line protocol until the payload size limit
+        (batch_max_bytes) is reached. An entity, which cannot be converted, is returned alone without a line, so that
+        it is dropped from the buffer.
+        :param buffer_entities: list of buffer entities
+        :return: number of consumed entities and list of data lines
+        """
+        data_lines = []
+        batch_bytes = 0
+        for buffer_entity in buffer_entities:
+            res_conversion, data_line = buffer_entity.convert_to_line_protocol()
+            if not res_conversion:
+                if data_lines:
+                    break
+                log_event(self.cfg, self.module_name, '', 'ERR', 'Problem with generating line protocol: %s', data_line)
+                return 1, []
+            line_bytes = len(data_line) + 1
+            if data_lines and batch_bytes + line_bytes > self.batch_max_bytes:
+                break
+            data_lines.append(data_line)
+            batch_bytes += line_bytes
+        return len(data_lines), data_lines
+
+    def _ingest_batch(self, data_lines):
+        """
+        This function ingests a batch of lines within a single request. If the server rejects the payload, the batch
+        is split in halves to isolate malformed points, which are then dropped. A rejected batch counts as a single
+        failed write, dropped points are counted separately.
+        :param data_lines: list of data lines
+        :return: number of leading lines, which are either written or rejected and hence can be removed from the buffer
+        """
+        done, rejected = self._write_lines(data_lines)
+        if done < len(data_lines):
+            self.write_failures.inc()
+        if rejected is not None:
+            done = self._split_batch(data_lines, rejected)
+        return done
+
+    def _write_lines(self, data_lines):
+        """
+        This function writes lines within a single request
+        :param data_lines: list of data lines
+        :return: number of written lines and the error, if the server rejected the payload as malformed
+        """
+        try:
+            started = time.perf_counter()
+            self.client.write(data_lines, database=self.db_name, precision='ms')
+            self.write_duration.observe(time.perf_counter() - started)
+            self.batch_size_histogram.observe(len(data_lines))
+            log_event(self.cfg, self.module_name, '', 'INFO', '%d line(s) inserted in influxdb', len(data_lines))
+            return len(data_lines), None
+        except InfluxDBClientError as err:
+            if err.code == 400:
+                return 0, err
+            log_event(self.cfg, self.module_name, '', 'WARN', 'Data insertion failed: %s', err)
+            return 0, None
+        except Exception as err:
+            log_event(self.cfg, self.module_name, '', 'WARN', 'Data insertion failed: %s', err)
+            return 0, None
+
+    def _split_batch(self, data_lines, err):
+        """
+        This function isolates malformed lines of a rejected batch by writing its halves separately
+        :param data_lines: list of data lines rejected by the server
+        :param err: error returned by the server
+        :return: number of leading lines, which are either written or rejected
+        """
+        if len(data_lines) == 1:
+            self.rejected_lines.inc()
+            log_event(self.cfg, self.module_name, '', 'ERR', 'Line >%s< rejected by influxdb: %s', data_lines[0], err)
+            return 1
+        done = 0
+        middle = len(data_lines) // 2
+        for half in (data_lines[:middle], data_lines[middle:]):
+            written, rejected = self._write_lines(half)
+            if rejected is not None:
+                written = self._split_batch(half, rejected)
+            done += written
+            if written < len(half):
                 break
-            time.sleep(self.write_interval / 1000.0)
+        return done
 
     def _create_db(self):
         """
@@ -212,30 +454,32 @@ class InfluxDBWriter:
             db_list = self.client.get_list_database()
             if not any(d['name'] == self.db_name for d in db_list):
                 self.client.create_database(self.db_name)
-                log_event(self.cfg, self.module_name, '', 'INFO', 'Database ' + self.db_name + ' successfully created')
+                log_event(self.cfg, self.module_name, '', 'INFO', 'Database %s successfully created', self.db_name)
             return True
         except Exception as err:
-            log_event(self.cfg, self.module_name, '', 'ERR', 'Cannot create database' + self.db_name + ': ' + str(err))
+            log_event(self.cfg, self.module_name, '', 'ERR', 'Cannot create database %s: %s', self.db_name, err)
             return False
 
-    def _ingest_data_point(self, data_line):
-        """
-        This function ingest one line into INFLUX DB
-        :param data_line: data line to ingest
-        :return: status of ingestion process
-        """
-        if data_line:
-            try:
-                ret = self.client.write_points(data_line, database=self.db_name, time_precision='ms', protocol='line')
-                log_event(self.cfg, self.module_name, '', 'INFO', 'Line >' + data_line + '< inserted in influxdb')
-                return True
-            except Exception as err:
-                log_event(self.cfg, self.module_name, '', 'WARN', 'Data insertion failed:' + str(err))
-                return False
-
     def exit(self):
         """
         Initiates closing of threads and disconnection from the INFLUXDB server
         :return:
         """
         self._exit = True
+        self._exit_event.set()
+        if self.runtime is not None:
+            self.runtime.stop()
+
+
+def create_writers(cfg, buffer):
+    """
+    This function creates a writer for the INFLUXDB server and one for each configured mirror. Every writer has its own
+    connectivity and ingestion threads and its own cursor over the shared buffer.
+    :param cfg: Set of parameters including influxdb parameters and optional mirrors
+    :param buffer: shared buffer
+    :return: list of writers, the first one writes to the INFLUXDB server
+    """
+    writers = [InfluxDBWriter(cfg=cfg, buffer=buffer)]
+    for i, target in enumerate(cfg['influxdb'].get('mirrors') or []):
+        writers.append(InfluxDBWriter(cfg=cfg, buffer=buffer, target=dict({'name': 'mirror' + str(i + 1)}, **target)))
+    return writers
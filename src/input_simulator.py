@@ -1,42 +1,89 @@
-from math import sin, pi
-from random import randint
+import numpy as np
+from src import traces
 
 
 class InputSimulator:
-    def __init__(self, initial_value, profile):
+    """
+    Simulator of an analog input. Values are generated in blocks by vectorised, seedable profiles (constant, ascending,
+    descending, sine, critical_low, random, random_walk) or replayed from a recorded trace (replay).
+    """
+
+    PROFILES = ('constant', 'ascending', 'descending', 'sine', 'critical_low', 'random', 'random_walk', 'replay')
+
+    def __init__(self, initial_value, profile, seed=None, trace_file=None, block_size=4096, trace=None):
+        """
+        Initialisation
+        :param initial_value: value before the first step, value of the constant profile
+        :param profile: profile name
+        :param seed: seed of the random profiles, None for a random seed
+        :param trace_file: .csv or .npy file replayed by the replay profile
+        :param block_size: number of values generated at once
+        :param trace: array replayed by the replay profile instead of trace_file
+        """
         self.profile = profile
         self.time_step = 0
         self.lower_limit = 50
         self.upper_limit = 60
+        self.block_size = block_size
 
+        self.initial_value = initial_value
         self.value = initial_value
         self.value_raw = self.voltage_to_raw(initial_value)
 
+        self._rng = np.random.default_rng(seed)
+        self._trace = None
+        if profile == 'replay':
+            self._trace = trace if trace is not None else traces.load_trace(trace_file)
+        if profile == 'replay' and not len(self._trace):
+            raise ValueError('Trace is empty: ' + str(trace_file))
+
+        # Generator state: time step and value after the last generated value
+        self._generated_step = 0
+        self._generated_value = float(initial_value)
+        self._walk_level = float(initial_value)
+        self._block = np.empty(0)
+        self._position = 0
+
     def voltage_to_raw(self, voltage):
         return (voltage - self.lower_limit) * 2**15/(self.upper_limit - self.lower_limit)
 
-    def calculate_next_value(self):
+    def generate(self, n):
+        """
+        This function generates the next n values of the profile independent of the stepwise iteration
+        :param n: number of values
+        :return: array of values
+        """
+        steps = np.arange(self._generated_step, self._generated_step + n)
         if self.profile == 'constant':
-            value = 58
+            values = traces.constant(steps, self.initial_value)
         elif self.profile == 'ascending':
-            value = min(self.value+0.1, self.upper_limit)
+            values = traces.ramp(n, self._generated_value, 0.1, self.lower_limit, self.upper_limit)
         elif self.profile == 'descending':
-            value = max(self.value-0.1, self.lower_limit)
+            values = traces.ramp(n, self._generated_value, -0.1, self.lower_limit, self.upper_limit)
         elif self.profile == 'sine':
-            value = (self.lower_limit + self.upper_limit)/2 +\
-                    (self.upper_limit - self.lower_limit)/2 * sin(self.time_step/(2*pi)/3 - pi/2)
+            values = traces.sine(steps, self.lower_limit, self.upper_limit)
         elif self.profile == 'critical_low':
-            if self.time_step <= 60:
-                value = self.upper_limit
-            elif self.time_step <= 90:
-                value = self.lower_limit
-            else:
-                value = self.value
-                self.reset_time()
+            values = traces.critical_low(steps, self.lower_limit, self.upper_limit)
         elif self.profile == 'random':
-            value = randint(self.lower_limit, self.upper_limit)
+            values = traces.random_uniform(self._rng, n, self.lower_limit, self.upper_limit)
+        elif self.profile == 'random_walk':
+            values, self._walk_level = traces.random_walk(
+                self._rng, n, self._walk_level, self.lower_limit, self.upper_limit)
+        elif self.profile == 'replay':
+            values = np.asarray(self._trace[steps % len(self._trace)], dtype=np.float64)
         else:
-            value = self.value
+            values = traces.constant(steps, self._generated_value)
+        self._generated_step += n
+        if n:
+            self._generated_value = float(values[-1])
+        return values
+
+    def calculate_next_value(self):
+        if self._position >= len(self._block):
+            self._block = self.generate(self.block_size)
+            self._position = 0
+        value = float(self._block[self._position])
+        self._position += 1
         self.time_step += 1
         self.value = value
         self.value_raw = self.voltage_to_raw(value)
@@ -50,7 +97,17 @@ class InputSimulator:
         return self.value_raw
 
     def reset_time(self):
+        """
+        This function restarts the profile with its initial value
+        :return:
+        """
         self.time_step = 0
+        self.value = self.initial_value
+        self._generated_step = 0
+        self._generated_value = float(self.initial_value)
+        self._walk_level = float(self.initial_value)
+        self._block = np.empty(0)
+        self._position = 0
 
 
 if __name__ == '__main__':
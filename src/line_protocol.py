@@ -0,0 +1,146 @@
+"""
+Encoder of data points into influxdb line protocol.
+
+The escaped "measurement,tags " prefix of every series and the escaped "key=" fragments of every field set are computed
+once and cached, so that encoding of a point consists only of formatting its field values and joining the parts.
+"""
+
+_MEASUREMENT_ESCAPES = str.maketrans({',': '\\,', ' ': '\\ '})
+_KEY_ESCAPES = str.maketrans({',': '\\,', '=': '\\=', ' ': '\\ '})
+_STRING_FIELD_ESCAPES = str.maketrans({'"': '\\"', '\\': '\\\\', '\n': '\\n'})
+
+
+def escape_measurement(measurement):
+    """
+    This function escapes commas and spaces in a measurement name
+    :param measurement: measurement name
+    :return: escaped measurement name
+    """
+    return str(measurement).translate(_MEASUREMENT_ESCAPES)
+
+
+def escape_key(key):
+    """
+    This function escapes commas, equal signs and spaces in tag keys, tag values and field keys
+    :param key: tag key, tag value or field key
+    :return: escaped string
+    """
+    return str(key).translate(_KEY_ESCAPES)
+
+
+def format_field_value(value):
+    """
+    This function formats a field value. Booleans are written as 0/1 and numbers without type suffix in order to stay
+    compatible with the field types of existing databases.
+    :param value: field value
+    :return: formatted field value
+    """
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, float)):
+        return str(value)
+    return '"' + str(value).translate(_STRING_FIELD_ESCAPES) + '"'
+
+
+# Formatters of the most common field value types, other types fall back to format_field_value
+_FIELD_FORMATTERS = {
+    float: float.__repr__,
+    int: int.__repr__,
+    bool: lambda value: '1' if value else '0',
+}
+
+
+class LineProtocolEncoder:
+    """
+    Line protocol encoder with cached series prefixes and field key fragments
+    """
+
+    def __init__(self, max_cache_size=10000):
+        """
+        Initialisation
+        :param max_cache_size: maximal number of cached series, the cache is reset if exceeded
+        """
+        self.max_cache_size = max_cache_size
+        self._prefixes = {}
+        self._field_keys = {}
+
+    def series_prefix(self, measurement, tags=None):
+        """
+        This function returns the escaped "measurement,tag=value " prefix of a series. Tags are sorted by key as
+        recommended for influxdb.
+        :param measurement: measurement name
+        :param tags: dict of tags
+        :return: escaped prefix including the separating space
+        """
+        series_key = (measurement, tuple(tags.items())) if tags else (measurement, ())
+        prefix = self._prefixes.get(series_key)
+        if prefix is None:
+            prefix = escape_measurement(measurement)
+            for key, value in sorted(series_key[1]):
+                prefix += ',' + escape_key(key) + '=' + escape_key(value)
+            prefix += ' '
+            if len(self._prefixes) >= self.max_cache_size:
+                self._prefixes.clear()
+            self._prefixes[series_key] = prefix
+        return prefix
+
+    def field_key_fragments(self, field_keys):
+        """
+        This function returns escaped "key=" fragments for a tuple of field keys
+        :param field_keys: tuple of field keys
+        :return: tuple of fragments
+        """
+        fragments = self._field_keys.get(field_keys)
+        if fragments is None:
+            fragments = tuple(escape_key(key) + '=' for key in field_keys)
+            if len(self._field_keys) >= self.max_cache_size:
+                self._field_keys.clear()
+            self._field_keys[field_keys] = fragments
+        return fragments
+
+    def encode(self, data):
+        """
+        This function encodes a data point into line protocol
+        :param data: dict with 'measurement', optional 'tags', 'fields' and 'timestamp'
+        :return: data line
+        """
+        fields = data['fields']
+        return self.encode_values(self.series_prefix(data['measurement'], data.get('tags')),
+                                  self.field_key_fragments(tuple(fields)), fields.values(), data['timestamp'])
+
+    @staticmethod
+    def encode_values(prefix, fragments, values, timestamp):
+        """
+        This function joins a series prefix, field key fragments, field values and timestamp into a data line
+        :param prefix: escaped series prefix returned by series_prefix
+        :param fragments: field key fragments returned by field_key_fragments
+        :param values: field values in the order of the fragments
+        :param timestamp: timestamp
+        :return: data line
+        """
+        if not fragments:
+            raise ValueError('Data point of ' + prefix.rstrip() + ' has no fields')
+        formatters = _FIELD_FORMATTERS
+        return (prefix
+                + ','.join([fragment + formatters.get(value.__class__, format_field_value)(value)
+                            for fragment, value in zip(fragments, values)])
+                + ' ' + str(timestamp))
+
+    @staticmethod
+    def encode_batch(buffer_entities):
+        """
+        This function encodes a list of buffer entities into a single payload
+        :param buffer_entities: list of buffer entities
+        :return: newline separated lines as bytes
+        """
+        data_lines = []
+        for buffer_entity in buffer_entities:
+            res_conversion, data_line = buffer_entity.convert_to_line_protocol()
+            if not res_conversion:
+                raise ValueError('Problem with generating line protocol: ' + str(data_line))
+            data_lines.append(data_line + '\n')
+        return ''.join(data_lines).encode('utf-8')
+
+
+# Encoder shared by all buffer entities
+encoder = LineProtocolEncoder()
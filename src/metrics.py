@@ -0,0 +1,253 @@
+import math
+import threading
+from bisect import bisect_left
+
+# Default histogram buckets for durations in s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    """
+    This function formats a sample value in the Prometheus text format
+    :param value: number
+    :return: text
+    """
+    if isinstance(value, int):
+        return str(int(value))
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    """
+    This function formats labels in the Prometheus text format
+    :param labels: tuple of label name and value pairs
+    :return: text including braces, empty if there are no labels
+    """
+    if not labels:
+        return ''
+    return '{' + ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"')
+                                       .replace('\n', '\\n')) for name, value in labels) + '}'
+
+
+class _ThreadCells:
+    """
+    Per-thread cells of a metric. Every thread updates its own cell without locking, readers sum up all cells. The lock
+    is taken only when a thread updates the metric for the first time.
+    """
+
+    def __init__(self, create_cell):
+        self._create_cell = create_cell
+        self._local = threading.local()
+        self._cells = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        This function returns the cell of the calling thread
+        :return:
+        """
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._create_cell()
+            with self._lock:
+                self._cells.append(cell)
+            self._local.cell = cell
+            return cell
+
+    def all(self):
+        """
+        This function returns the cells of all threads
+        :return:
+        """
+        with self._lock:
+            return list(self._cells)
+
+
+class Counter:
+    """
+    Monotonically increasing counter
+    """
+
+    TYPE = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._cells = _ThreadCells(lambda: [0])
+
+    def inc(self, amount=1):
+        """
+        This function increases the counter
+        :param amount: non-negative increment
+        :return:
+        """
+        self._cells.get()[0] += amount
+
+    def value(self):
+        return sum(cell[0] for cell in self._cells.all())
+
+    def samples(self):
+        """
+        This function returns the samples of the metric
+        :return: list of tuples with name suffix, labels and value
+        """
+        return [('', self.labels, self.value())]
+
+
+class Gauge:
+    """
+    Value, which can go up and down. It is either set explicitly or computed by a function at collection time, so that
+    values like buffer sizes do not cost anything on the hot path.
+    """
+
+    TYPE = 'gauge'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._value = 0
+        self._function = None
+
+    def set(self, value):
+        """
+        This function sets the value
+        :param value: number
+        :return:
+        """
+        self._value = value
+
+    def set_function(self, function):
+        """
+        This function sets a function computing the value at collection time
+        :param function: function without arguments returning a number
+        :return:
+        """
+        self._function = function
+
+    def value(self):
+        if self._function is not None:
+            return self._function()
+        return self._value
+
+    def samples(self):
+        """
+        This function returns the samples of the metric
+        :return: list of tuples with name suffix, labels and value
+        """
+        return [('', self.labels, self.value())]
+
+
+class Histogram:
+    """
+    Distribution of observed values in cumulative buckets with their sum and count
+    """
+
+    TYPE = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # Cell: counts per bucket including +Inf, sum of observed values
+        self._cells = _ThreadCells(lambda: [[0] * (len(self.buckets) + 1), 0.0])
+
+    def observe(self, value):
+        """
+        This function records an observed value
+        :param value: number
+        :return:
+        """
+        cell = self._cells.get()
+        cell[0][bisect_left(self.buckets, value)] += 1
+        cell[1] += value
+
+    def samples(self):
+        """
+        This function returns the samples of the metric
+        :return: list of tuples with name suffix, labels and value
+        """
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        for cell in self._cells.all():
+            for i, count in enumerate(cell[0]):
+                counts[i] += count
+            total += cell[1]
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            samples.append(('_bucket', self.labels + (('le', _format_value(float(bound))),), cumulative))
+        samples.append(('_sum', self.labels, total))
+        samples.append(('_count', self.labels, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Registry of metrics rendered in the Prometheus text format. A metric is identified by its name and labels, repeated
+    registrations return the existing metric.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class, name, help_text, labels, **kwargs):
+        """
+        This function returns a registered metric and registers it if required
+        :param metric_class: Counter, Gauge or Histogram
+        :param name: metric name
+        :param help_text: description of the metric
+        :param labels: dict of labels
+        :return: metric
+        """
+        labels = tuple(sorted(labels.items())) if labels else ()
+        key = (name, labels)
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = metric_class(name, help_text, labels, **kwargs)
+                    self._metrics[key] = metric
+        if not isinstance(metric, metric_class):
+            raise ValueError('Metric ' + name + ' is already registered as ' + metric.TYPE)
+        return metric
+
+    def counter(self, name, help_text, labels=None):
+        return self._register(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=None):
+        return self._register(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=None, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self):
+        """
+        This function renders all metrics in the Prometheus text format
+        :return: text
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        families = {}
+        for metric in metrics:
+            families.setdefault(metric.name, []).append(metric)
+        lines = []
+        for name, family in families.items():
+            lines.append('# HELP ' + name + ' ' + family[0].help_text)
+            lines.append('# TYPE ' + name + ' ' + family[0].TYPE)
+            for metric in family:
+                for suffix, labels, value in metric.samples():
+                    lines.append(name + suffix + _format_labels(labels) + ' ' + _format_value(value))
+        return '\n'.join(lines) + '\n'
+
+
+# Registry shared by all modules
+metrics_registry = MetricsRegistry()
@@ -0,0 +1,275 @@
+"""
+Processing stages between data acquisition and the buffer. Every stage offers add_point() like the buffer itself and
+forwards the resulting points to its sink, so that stages can be chained in front of the buffer.
+"""
+import threading
+from src.point import Point, registry
+
+
+class PipelineStage:
+    """
+    Base pipeline stage forwarding all points to its sink
+    """
+
+    def __init__(self, sink):
+        """
+        Initialisation
+        :param sink: next stage or buffer
+        """
+        self.sink = sink
+
+    def add_point(self, point):
+        """
+        This function processes a data point
+        :param point: data point
+        :return:
+        """
+        self.sink.add_point(point)
+
+    def flush(self):
+        """
+        This function emits pending points and flushes the sink
+        :return:
+        """
+        self.sink.flush()
+
+    def get_statistics(self):
+        """
+        This function returns the statistics of this and the following stages
+        :return: dict of stage name and statistics
+        """
+        return self.sink.get_statistics() if isinstance(self.sink, PipelineStage) else {}
+
+
+class _Window:
+    """
+    Running aggregates of the fields of a series within a time window
+    """
+
+    __slots__ = ('start', 'count', 'sums', 'mins', 'maxs', 'firsts', 'lasts')
+
+    def __init__(self, start, values):
+        self.start = start
+        self.count = 1
+        self.sums = list(values)
+        self.mins = list(values)
+        self.maxs = list(values)
+        self.firsts = values
+        self.lasts = values
+
+    def add(self, values):
+        self.count += 1
+        for i, value in enumerate(values):
+            self.sums[i] += value
+            if value < self.mins[i]:
+                self.mins[i] = value
+            if value > self.maxs[i]:
+                self.maxs[i] = value
+        self.lasts = values
+
+
+# Aggregate functions computing a field value from a window and the field index
+AGGREGATE_FUNCTIONS = {
+    'min': lambda window, i: window.mins[i],
+    'max': lambda window, i: window.maxs[i],
+    'mean': lambda window, i: window.sums[i] / window.count,
+    'sum': lambda window, i: window.sums[i],
+    'count': lambda window, i: window.count,
+    'first': lambda window, i: window.firsts[i],
+    'last': lambda window, i: window.lasts[i],
+}
+
+
+class Aggregator(PipelineStage):
+    """
+    Stage downsampling configured measurements: points are aggregated per series and time window, one point with
+    aggregated fields (e.g. Value_min, Value_mean) is emitted per window. Optionally, raw points are passed through with
+    a reduced rate. Points of measurements without configuration are forwarded unchanged.
+    """
+
+    def __init__(self, cfg, sink):
+        """
+        Initialisation
+        :param cfg: Set of parameters including aggregation settings per measurement
+        :param sink: next stage or buffer
+        """
+        super().__init__(sink)
+        self.cfg = cfg
+        self.rules = {}
+        for measurement, rule in (cfg.get('aggregation') or {}).items():
+            functions = rule.get('functions', ['min', 'mean', 'max', 'last'])
+            unknown = [function for function in functions if function not in AGGREGATE_FUNCTIONS]
+            if unknown:
+                raise ValueError('Unknown aggregate function(s) for ' + measurement + ': ' + ', '.join(unknown))
+            raw_rate = rule.get('raw_rate', 0)
+            self.rules[measurement] = (round(rule.get('window', 10) * 1000), functions,
+                                       round(1000 / raw_rate) if raw_rate else None)
+
+        self._windows = {}
+        self._last_raw = {}
+        self._aggregate_series = {}
+        self._lock = threading.Lock()
+
+    def add_point(self, point):
+        """
+        This function aggregates a data point of a configured measurement or forwards it
+        :param point: data point
+        :return:
+        """
+        series = point.series
+        rule = self.rules.get(series.measurement)
+        if rule is None:
+            self.sink.add_point(point)
+            return
+        window_size, functions, raw_interval = rule
+
+        emitted = []
+        with self._lock:
+            if raw_interval is not None and point.timestamp - self._last_raw.get(series, -raw_interval) >= raw_interval:
+                self._last_raw[series] = point.timestamp
+                emitted.append(point)
+
+            window_start = point.timestamp - point.timestamp % window_size
+            window = self._windows.get(series)
+            if window is not None and window.start == window_start:
+                window.add(point.values)
+            else:
+                if window is not None:
+                    emitted.append(self._aggregate(series, window, functions))
+                self._windows[series] = _Window(window_start, point.values)
+
+        for emitted_point in emitted:
+            self.sink.add_point(emitted_point)
+
+    def flush(self):
+        """
+        This function emits aggregates of all open windows
+        :return:
+        """
+        with self._lock:
+            windows = self._windows
+            self._windows = {}
+            emitted = [self._aggregate(series, window, self.rules[series.measurement][1])
+                       for series, window in windows.items()]
+        for point in emitted:
+            self.sink.add_point(point)
+        super().flush()
+
+    def _aggregate(self, series, window, functions):
+        """
+        This function creates the point of a completed window, timestamped with the window start
+        :param series: series of the raw points
+        :param window: completed window
+        :param functions: aggregate functions
+        :return: aggregated point
+        """
+        aggregate_series = self._aggregate_series.get(series)
+        if aggregate_series is None:
+            aggregate_series = registry.register(
+                series.measurement, series.tags,
+                tuple(key + '_' + function for key in series.field_keys for function in functions))
+            self._aggregate_series[series] = aggregate_series
+        values = tuple(AGGREGATE_FUNCTIONS[function](window, i)
+                       for i in range(len(series.field_keys)) for function in functions)
+        return Point(aggregate_series, window.start, values)
+
+
+class DeadbandFilter(PipelineStage):
+    """
+    Stage recording configured measurements by exception: a point is forwarded only if a field value left the deadband
+    around the last recorded value, or if the heartbeat interval passed since the last recorded point of its series.
+    Deadband modes are 'exact' (any change), 'absolute' (difference greater than deadband) and 'percent' (difference
+    greater than deadband percent of the last recorded value). Non-numeric values are always compared exactly.
+    """
+
+    MODES = ('exact', 'absolute', 'percent')
+
+    def __init__(self, cfg, sink):
+        """
+        Initialisation
+        :param cfg: Set of parameters including deadband settings per measurement
+        :param sink: next stage or buffer
+        """
+        super().__init__(sink)
+        self.cfg = cfg
+        self.rules = {}
+        for measurement, rule in (cfg.get('deadband') or {}).items():
+            mode = rule.get('mode', 'exact')
+            if mode not in self.MODES:
+                raise ValueError('Unknown deadband mode for ' + measurement + ': ' + str(mode))
+            heartbeat = rule.get('heartbeat', 0)
+            self.rules[measurement] = (mode, rule.get('deadband', 0), round(heartbeat * 1000) if heartbeat else None)
+
+        # Last recorded point per series and counters per measurement
+        self._recorded = {}
+        self.passed = dict.fromkeys(self.rules, 0)
+        self.suppressed = dict.fromkeys(self.rules, 0)
+        self._lock = threading.Lock()
+
+    def add_point(self, point):
+        """
+        This function forwards a data point of a configured measurement, if it left the deadband or is due for the
+        heartbeat, and suppresses it otherwise
+        :param point: data point
+        :return:
+        """
+        measurement = point.series.measurement
+        rule = self.rules.get(measurement)
+        if rule is None:
+            self.sink.add_point(point)
+            return
+
+        with self._lock:
+            recorded = self._recorded.get(point.series)
+            if recorded is not None and not self._exceeds(rule, recorded, point):
+                self.suppressed[measurement] += 1
+                return
+            self._recorded[point.series] = point
+            self.passed[measurement] += 1
+        self.sink.add_point(point)
+
+    @staticmethod
+    def _exceeds(rule, recorded, point):
+        """
+        This function checks whether a point has to be recorded in respect to the last recorded point
+        :param rule: mode, deadband and heartbeat interval in ms
+        :param recorded: last recorded point of the series
+        :param point: data point
+        :return:
+        """
+        mode, deadband, heartbeat = rule
+        if heartbeat is not None and point.timestamp - recorded.timestamp >= heartbeat:
+            return True
+        for last, value in zip(recorded.values, point.values):
+            if mode == 'exact' or isinstance(value, (bool, str)) or isinstance(last, (bool, str)):
+                if value != last:
+                    return True
+            elif mode == 'absolute':
+                if abs(value - last) > deadband:
+                    return True
+            elif abs(value - last) > abs(last) * deadband / 100:
+                return True
+        return False
+
+    def get_statistics(self):
+        """
+        This function returns the numbers of recorded and suppressed points per measurement
+        :return: dict of stage name and statistics
+        """
+        statistics = super().get_statistics()
+        with self._lock:
+            statistics['deadband'] = {measurement: {'passed': self.passed[measurement],
+                                                    'suppressed': self.suppressed[measurement]}
+                                      for measurement in self.rules}
+        return statistics
+
+
+def build_pipeline(cfg, buffer):
+    """
+    This function chains the configured stages in front of the buffer: aggregation, then deadband filtering of the
+    points to be recorded
+    :param cfg: Set of parameters
+    :param buffer: buffer receiving the processed points
+    :return: first stage of the pipeline
+    """
+    return Aggregator(cfg, DeadbandFilter(cfg, buffer))
@@ -0,0 +1,113 @@
+import threading
+from src.line_protocol import encoder
+
+
+class Series:
+    """
+    Series describes the invariant part of data points: measurement, tags and field keys. Its line protocol prefix and
+    field key fragments are computed once at registration.
+    """
+
+    __slots__ = ('series_id', 'measurement', 'tags', 'field_keys', 'prefix', 'fragments')
+
+    def __init__(self, series_id, measurement, tags, field_keys):
+        self.series_id = series_id
+        self.measurement = measurement
+        self.tags = dict(tags) if tags else {}
+        self.field_keys = tuple(field_keys)
+        self.prefix = encoder.series_prefix(measurement, self.tags)
+        self.fragments = encoder.field_key_fragments(self.field_keys)
+
+
+class SeriesRegistry:
+    """
+    Registry interning series, so that all points of a series share one series object
+    """
+
+    def __init__(self):
+        self._series = {}
+        self._series_by_id = []
+        self._lock = threading.Lock()
+
+    def register(self, measurement, tags=None, field_keys=('Value',)):
+        """
+        This function returns the series for given measurement, tags and field keys and registers it if required
+        :param measurement: measurement name
+        :param tags: dict of tags
+        :param field_keys: tuple of field keys
+        :return: series
+        """
+        key = (measurement, tuple(tags.items()) if tags else (), tuple(field_keys))
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.get(key)
+                if series is None:
+                    series = Series(len(self._series_by_id), measurement, tags, field_keys)
+                    self._series_by_id.append(series)
+                    self._series[key] = series
+        return series
+
+    def get(self, series_id):
+        """
+        This function returns a registered series by its id
+        :param series_id: id of the series
+        :return: series
+        """
+        return self._series_by_id[series_id]
+
+
+# Registry shared by all points
+registry = SeriesRegistry()
+
+
+class Point:
+    """
+    Compact data point: reference to its series, timestamp in ms and a tuple of field values in the order of the
+    series field keys
+    """
+
+    __slots__ = ('series', 'timestamp', 'values')
+
+    def __init__(self, series, timestamp, values):
+        self.series = series
+        self.timestamp = timestamp
+        self.values = values
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        This function creates a point from the dict form used by BufferEntity
+        :param data: dict with 'measurement', optional 'tags', 'fields' and 'timestamp'
+        :return: point
+        """
+        fields = data['fields']
+        series = registry.register(data['measurement'], data.get('tags'), tuple(fields))
+        return cls(series, data['timestamp'], tuple(fields.values()))
+
+    @property
+    def measurement(self):
+        return self.series.measurement
+
+    @property
+    def data(self):
+        """
+        This function returns the point in the dict form used by BufferEntity
+        :return:
+        """
+        data = {'measurement': self.series.measurement,
+                'fields': dict(zip(self.series.field_keys, self.values)),
+                'timestamp': self.timestamp}
+        if self.series.tags:
+            data['tags'] = dict(self.series.tags)
+        return data
+
+    def convert_to_line_protocol(self):
+        """
+        This function converts the point into influxdb line protocol
+        :return:
+        """
+        try:
+            return [True, encoder.encode_values(self.series.prefix, self.series.fragments, self.values, self.timestamp)]
+        except Exception as err:
+            return [False, err]
@@ -0,0 +1,112 @@
+import re
+import zipfile
+import xml.etree.ElementTree as ElementTree
+
+_XLSX_NS = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+
+class RelayTable:
+    """
+    Relay states per consumption level as bitmasks: bit n is set if relay n+1 is switched on. A transition between any
+    two levels is the XOR of their masks, so that only relays, which actually change, are written.
+    """
+
+    def __init__(self, masks):
+        """
+        Initialisation
+        :param masks: list of relay bitmasks, index is the consumption level
+        """
+        self.masks = list(masks)
+
+    @classmethod
+    def from_changes(cls, mapping_table):
+        """
+        This function derives the masks from a table of relay changes per level step: row n lists the relays switched
+        on (positive number) and off (negative number) when going from level n to level n+1
+        :param mapping_table: list of relay changes per level step
+        :return: relay table
+        """
+        masks = [0]
+        for step, changes in enumerate(mapping_table):
+            mask = masks[-1]
+            for change in changes:
+                bit = 1 << (abs(change) - 1)
+                if bool(mask & bit) == (change > 0):
+                    raise ValueError('Inconsistent mapping table: relay ' + str(abs(change)) + ' is already ' +
+                                     ('on' if change > 0 else 'off') + ' at level ' + str(step))
+                mask ^= bit
+            masks.append(mask)
+        return cls(masks)
+
+    @classmethod
+    def from_xlsx(cls, path):
+        """
+        This function loads the masks from the relay map workbook: from the second row on, each row describes a
+        consumption level starting with level 1, column A holds the load and columns B to M the relay states (+/-)
+        :param path: path to the workbook
+        :return: relay table
+        """
+        with zipfile.ZipFile(path) as workbook:
+            try:
+                strings = [''.join(text.text or '' for text in item.iter('{%s}t' % _XLSX_NS['s']))
+                           for item in ElementTree.fromstring(workbook.read('xl/sharedStrings.xml'))]
+            except KeyError:
+                strings = []
+            sheet = ElementTree.fromstring(workbook.read('xl/worksheets/sheet1.xml'))
+
+        masks = [0]
+        for row in sheet.iterfind('s:sheetData/s:row', _XLSX_NS):
+            if int(row.get('r')) < 2:
+                continue
+            mask = 0
+            for cell in row.iterfind('s:c', _XLSX_NS):
+                column = re.match('[A-Z]+', cell.get('r')).group()
+                value = cell.find('s:v', _XLSX_NS)
+                if len(column) != 1 or not 'B' <= column <= 'M' or value is None:
+                    continue
+                state = strings[int(value.text)] if cell.get('t') == 's' else value.text
+                if state == '+':
+                    mask |= 1 << (ord(column) - ord('B'))
+            masks.append(mask)
+        return cls(masks)
+
+    def levels(self):
+        """
+        This function returns the number of consumption levels
+        :return:
+        """
+        return len(self.masks)
+
+    def mask(self, level):
+        """
+        This function returns the relay bitmask of a consumption level
+        :param level: consumption level
+        :return:
+        """
+        return self.masks[level]
+
+    def transition(self, from_level, to_level):
+        """
+        This function returns the relays to be changed between two levels
+        :param from_level: current consumption level
+        :param to_level: desired consumption level
+        :return: bitmask of changing relays
+        """
+        return self.masks[from_level] ^ self.masks[to_level]
+
+    @staticmethod
+    def changes(current_mask, target_mask):
+        """
+        This function lists the relay writes required to get from one relay state to another
+        :param current_mask: current relay bitmask
+        :param target_mask: desired relay bitmask
+        :return: list of relay index (0-based) and desired state
+        """
+        diff = current_mask ^ target_mask
+        changes = []
+        while diff:
+            bit = diff & -diff
+            relay = bit.bit_length() - 1
+            changes.append((relay, bool(target_mask & bit)))
+            diff ^= bit
+        return changes
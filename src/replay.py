@@ -0,0 +1,124 @@
+"""
+Replay harness driving the controller over a recorded or simulated voltage trace with a simulated clock, i.e. as fast
+as the CPU allows.
+
+Usage (from the repository root):
+    python -m src.replay <profile or trace file> [duration in h] [seed]
+"""
+import copy
+import sys
+import time
+import numpy as np
+import yaml
+from src.clock import SimulatedClock
+from src.edge_node import EdgeNode
+from src.input_simulator import InputSimulator
+from src.pipeline import build_pipeline
+from src.traces import load_trace
+
+
+class CountingSink:
+    """
+    Sink counting the recorded points instead of buffering them
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def add_point(self, point):
+        self.count += 1
+
+    def flush(self):
+        pass
+
+
+class ControllerReplay:
+    """
+    Harness executing the sampling and control channels of an edge node at their deadlines on a simulated clock. The
+    voltage input replays the given trace with the configured voltage rate.
+    """
+
+    def __init__(self, cfg, trace):
+        """
+        Initialisation
+        :param cfg: Set of parameters
+        :param trace: array of voltage values
+        """
+        self.cfg = copy.deepcopy(cfg)
+        self.cfg['simulation']['active'] = True
+        self.cfg['hal'] = {'backend': 'simulated'}
+        self.cfg['event_logger'] = dict(self.cfg['event_logger'], publish=False, print_level='ERR')
+        self.trace = trace
+
+        self.clock = SimulatedClock()
+        self.sink = CountingSink()
+        self.node = EdgeNode(self.cfg, build_pipeline(self.cfg, self.sink), clock=self.clock)
+        backend = self.node.gpio_interface.backend
+        backend.simulators[self.cfg['gpio']['voltage_sensor'].get('channel', 0)] = \
+            InputSimulator(float(trace[0]), 'replay', trace=trace)
+        backend.switches = 0
+
+    def run(self, duration=None):
+        """
+        This function replays the trace
+        :param duration: simulated duration in seconds, by default the duration of the trace
+        :return: dict with level trajectory (array of time in s and level per control step), number of relay switches,
+        energy diverted (load * h), number of recorded points and wall-clock duration of the replay
+        """
+        if duration is None:
+            duration = len(self.trace) / self.cfg['sampling'].get('voltage_rate', 1)
+        node = self.node
+        channels = node.sampling_channels + [node.control_channel]
+        loads = self.cfg['controller']['loads']
+
+        started = time.perf_counter()
+        start = self.clock.monotonic()
+        end = start + duration
+        for channel in channels:
+            channel.reset(start)
+
+        trajectory = []
+        energy = 0.0
+        last_time = start
+        while True:
+            channel = min(channels, key=lambda c: c.next_deadline)
+            if channel.next_deadline > end:
+                break
+            self.clock.advance_to(channel.next_deadline)
+            if channel is node.control_channel:
+                # The load of the current level is applied until the control step
+                energy += loads[node.consumption_level] * (self.clock.monotonic() - last_time)
+                last_time = self.clock.monotonic()
+                channel.step(self.clock.monotonic)
+                trajectory.append((self.clock.monotonic() - start, node.consumption_level))
+            else:
+                channel.step(self.clock.monotonic)
+        energy += loads[node.consumption_level] * (end - last_time)
+        node.buffer.flush()
+
+        return {'levels': np.array(trajectory, dtype=np.float64).reshape(-1, 2),
+                'relay_switches': node.gpio_interface.backend.switches,
+                'energy': energy / 3600,
+                'points_recorded': self.sink.count,
+                'wall_time': time.perf_counter() - started}
+
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else 'sine'
+    hours = float(sys.argv[2]) if len(sys.argv) > 2 else 24
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+
+    with open('config.yaml') as config_file:
+        cfg = yaml.safe_load(config_file)
+    n_samples = round(hours * 3600 * cfg['sampling'].get('voltage_rate', 1))
+    if source in InputSimulator.PROFILES:
+        trace = InputSimulator(cfg['simulation'].get('initial_value', 55), source, seed=seed).generate(n_samples)
+    else:
+        trace = load_trace(source)
+
+    result = ControllerReplay(cfg, trace).run(hours * 3600)
+    levels = result['levels'][:, 1]
+    print('%.1f h replayed in %.2f s: %d control steps, %d level changes, level min/mean/max %d/%.2f/%d, '
+          '%d relay switches, energy %.2f, %d points recorded'
+          % (hours, result['wall_time'], len(levels), np.count_nonzero(np.diff(levels)), levels.min(), levels.mean(),
+             levels.max(), result['relay_switches'], result['energy'], result['points_recorded']))
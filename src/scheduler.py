@@ -0,0 +1,179 @@
+import math
+import threading
+import time
+
+
+class ChannelStatistics:
+    """
+    Timing statistics of a periodic channel: jitter is the delay between the deadline and the actual start of a step,
+    an overrun is a step, which completed after the next deadline had already passed
+    """
+
+    __slots__ = ('steps', 'overruns', 'skipped', 'jitter_sum', 'jitter_max', 'duration_sum', 'duration_max')
+
+    def __init__(self):
+        self.steps = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.jitter_sum = 0.0
+        self.jitter_max = 0.0
+        self.duration_sum = 0.0
+        self.duration_max = 0.0
+
+    def as_dict(self):
+        """
+        This function returns the statistics as dict, times are in ms
+        :return:
+        """
+        return {'steps': self.steps,
+                'overruns': self.overruns,
+                'skipped': self.skipped,
+                'jitter_mean': self.jitter_sum / self.steps * 1000 if self.steps else 0.0,
+                'jitter_max': self.jitter_max * 1000,
+                'duration_mean': self.duration_sum / self.steps * 1000 if self.steps else 0.0,
+                'duration_max': self.duration_max * 1000}
+
+
+class PeriodicChannel:
+    """
+    Periodic activity scheduled by absolute deadlines: the n-th step is due at start + n * period, so that the timing
+    does not drift with the duration of the steps. Missed deadlines are skipped instead of being caught up.
+    """
+
+    def __init__(self, name, period, callback, start_delay=0.0):
+        """
+        Initialisation
+        :param name: channel name
+        :param period: period in seconds
+        :param callback: function executed every period
+        :param start_delay: delay of the first step after start in seconds
+        """
+        self.name = name
+        self.period = period
+        self.callback = callback
+        self.start_delay = start_delay
+        self.next_deadline = 0.0
+        self.statistics = ChannelStatistics()
+        # Optional histograms observing jitter and duration of every step
+        self.jitter_histogram = None
+        self.duration_histogram = None
+
+    @classmethod
+    def from_rate(cls, name, rate, callback):
+        """
+        This function creates a channel from a rate in Hz
+        :param name: channel name
+        :param rate: rate in Hz
+        :param callback: function executed with the given rate
+        :return:
+        """
+        return cls(name, 1.0 / rate, callback)
+
+    def reset(self, now):
+        """
+        This function sets the first deadline
+        :param now: current monotonic time
+        :return:
+        """
+        self.next_deadline = now + self.start_delay
+
+    def complete(self, started, finished):
+        """
+        This function updates the statistics after a step and advances the deadline
+        :param started: monotonic time, when the step started
+        :param finished: monotonic time, when the step finished
+        :return:
+        """
+        statistics = self.statistics
+        jitter = started - self.next_deadline
+        duration = finished - started
+        statistics.steps += 1
+        statistics.jitter_sum += jitter
+        statistics.jitter_max = max(statistics.jitter_max, jitter)
+        statistics.duration_sum += duration
+        statistics.duration_max = max(statistics.duration_max, duration)
+        if self.jitter_histogram is not None:
+            self.jitter_histogram.observe(jitter)
+            self.duration_histogram.observe(duration)
+
+        self.next_deadline += self.period
+        if self.next_deadline <= finished:
+            missed = math.floor((finished - self.next_deadline) / self.period) + 1
+            statistics.overruns += 1
+            statistics.skipped += missed
+            self.next_deadline += missed * self.period
+
+    def step(self, clock=time.monotonic):
+        """
+        This function executes the callback and accounts its timing
+        :param clock: monotonic clock
+        :return:
+        """
+        started = clock()
+        self.callback()
+        self.complete(started, clock())
+
+
+class Scheduler:
+    """
+    Scheduler executing periodic channels in a single thread. Each channel is executed at its own absolute deadlines,
+    the thread sleeps until the earliest deadline and is woken up immediately on stop.
+    """
+
+    def __init__(self, name, channels, clock=time.monotonic):
+        """
+        Initialisation
+        :param name: scheduler name used for the thread
+        :param channels: list of periodic channels
+        :param clock: monotonic clock
+        """
+        self.name = name
+        self.channels = list(channels)
+        self.clock = clock
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        This function starts the scheduler thread
+        :return:
+        """
+        if self.running():
+            return
+        self._stop.clear()
+        now = self.clock()
+        for channel in self.channels:
+            channel.reset(now)
+        self._thread = threading.Thread(target=self._run, name=self.name)
+        self._thread.start()
+
+    def stop(self, wait=True):
+        """
+        This function stops the scheduler thread
+        :param wait: if True, waits for the completion of the running step
+        :return:
+        """
+        self._stop.set()
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def get_statistics(self):
+        """
+        This function returns timing statistics per channel
+        :return: dict of channel name and statistics
+        """
+        return {channel.name: channel.statistics.as_dict() for channel in self.channels}
+
+    def _run(self):
+        """
+        This function executes due channels until stopped
+        :return:
+        """
+        while self.channels:
+            channel = min(self.channels, key=lambda c: c.next_deadline)
+            if self._stop.wait(max(channel.next_deadline - self.clock(), 0)):
+                break
+            channel.step(self.clock)
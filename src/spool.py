@@ -0,0 +1,444 @@
+import os
+import threading
+import time
+
+
+class SpooledEntity:
+    """
+    Buffer entity restored from the spool. It already holds an encoded line in influxdb line protocol.
+    """
+
+    __slots__ = ('data_line',)
+
+    def __init__(self, data_line):
+        self.data_line = data_line
+
+    def convert_to_line_protocol(self):
+        """
+        This function returns the spooled line as it is
+        :return:
+        """
+        return [True, self.data_line]
+
+
+class _Segment:
+    """
+    Append-only segment file of the spool. Each record is a single line terminated by a newline character.
+    """
+
+    __slots__ = ('first_seq', 'path', 'count', 'size')
+
+    def __init__(self, first_seq, path, count=0, size=0):
+        self.first_seq = first_seq
+        self.path = path
+        self.count = count
+        self.size = size
+
+
+class Spool:
+    """
+    Disk-backed write-ahead spool of encoded line-protocol records. Records are appended to segment files, which are
+    fsync'd in groups and rotated once they exceed the segment size. The sequence number and byte offset of the oldest
+    unacknowledged record are persisted in a head file, so that unacknowledged records are replayed after a restart.
+    Segments are removed as soon as all their records are acknowledged.
+
+    The owner serialises all calls except read_records and persist, which perform the expensive disk I/O: read_plan
+    and take_persist capture what is to be done, i.e. records to be read, segments to be fsync'd, the head to be
+    written and segments to be removed, so that the owner can release its lock before the files are accessed.
+    """
+
+    # Maximal number of remembered byte offsets of read records
+    MAX_KNOWN_OFFSETS = 65536
+
+    HEAD_FILE = 'head'
+    SEGMENT_SUFFIX = '.seg'
+
+    def __init__(self, spool_dir, segment_size=1048576, fsync_every=50, fsync_interval=1.0, max_size=None):
+        """
+        Initialisation
+        :param spool_dir: directory, where segment files are stored
+        :param segment_size: size of a segment file in bytes, after which a new segment is started
+        :param fsync_every: number of records after which appended data is fsync'd
+        :param fsync_interval: time in seconds after which appended data is fsync'd
+        :param max_size: maximal size of the spool in bytes. If exceeded, the oldest segment is dropped.
+        """
+        self.spool_dir = spool_dir
+        self.segment_size = segment_size
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.max_size = max_size
+
+        self.head_seq = 0
+        self.tail_seq = 0
+        self._head_offset = 0
+        self._segments = []
+        self._writer = None
+        self._pending_sync = 0
+        self._last_sync = time.monotonic()
+        self._opened = False
+        # Duplicated descriptors of segments, whose appended records are to be fsync'd by persist
+        self._sync_fds = []
+
+        # Byte offsets of records known from reads by sequence number: (first sequence number of the segment, offset)
+        self._offsets = {}
+        # Head not yet persisted and segments to be removed once the head is persisted
+        self._head_dirty = False
+        self._obsolete = []
+        # Head file writes are serialised, an older head never overwrites a newer one
+        self._persist_lock = threading.Lock()
+        self._persisted_seq = 0
+
+    def __len__(self):
+        return self.tail_seq - self.head_seq
+
+    def size(self):
+        """
+        This function returns the total size of the segment files in bytes
+        :return:
+        """
+        return sum(segment.size for segment in self._segments)
+
+    def full(self):
+        """
+        This function checks whether the spool reached its maximal size
+        :return:
+        """
+        return self.max_size is not None and self.size() >= self.max_size
+
+    def open(self):
+        """
+        This function scans the spool directory and restores unacknowledged records
+        :return: number of restored records
+        """
+        if self._opened:
+            return len(self)
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+        head_seq, head_offset = self._read_head()
+
+        segments = []
+        for file_name in sorted(os.listdir(self.spool_dir)):
+            if not file_name.endswith(self.SEGMENT_SUFFIX):
+                continue
+            path = os.path.join(self.spool_dir, file_name)
+            first_seq = int(file_name[:-len(self.SEGMENT_SUFFIX)])
+            count, size = self._scan_segment(path)
+            segments.append(_Segment(first_seq, path, count, size))
+
+        # Segments with acknowledged records only are obsolete
+        while segments and segments[0].first_seq + segments[0].count <= head_seq:
+            os.remove(segments.pop(0).path)
+
+        if segments and segments[0].first_seq > head_seq:
+            head_seq, head_offset = segments[0].first_seq, 0
+        self._segments = segments
+        self.head_seq = head_seq
+        self._head_offset = head_offset if segments else 0
+        self.tail_seq = segments[-1].first_seq + segments[-1].count if segments else head_seq
+        self._persisted_seq = head_seq
+
+        if segments and segments[-1].size < self.segment_size:
+            self._writer = open(segments[-1].path, 'ab')
+        self._opened = True
+        return len(self)
+
+    def append(self, data_line):
+        """
+        This function appends an encoded record to the active segment
+        :param data_line: line in influxdb line protocol
+        :return: number of records dropped because the spool exceeded its maximal size
+        """
+        if not self._opened:
+            self.open()
+        if self._writer is None or self._segments[-1].size >= self.segment_size:
+            self._rotate()
+
+        data = (data_line + '\n').encode('utf-8')
+        self._writer.write(data)
+        segment = self._segments[-1]
+        segment.count += 1
+        segment.size += len(data)
+        self.tail_seq += 1
+
+        self._pending_sync += 1
+        if self._pending_sync >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.request_sync()
+
+        if self.max_size is not None:
+            return self._enforce_max_size()
+        return 0
+
+    def read(self, n, offset=0):
+        """
+        This function reads up to n records without acknowledging them
+        :param n: maximal number of records
+        :param offset: number of records after the head to skip
+        :return: list of lines
+        """
+        data_lines, offsets = self.read_records(self.read_plan(n, offset))
+        self.remember_offsets(offsets)
+        return data_lines
+
+    def read_plan(self, n, offset=0):
+        """
+        This function determines the file positions of up to n records without reading them
+        :param n: maximal number of records
+        :param offset: number of records after the head to skip
+        :return: list of tuples with segment path, first sequence number of the segment, sequence number of the first
+        record to read, byte offset to start from, number of records to skip from there and number of records to read
+        """
+        if not self._opened:
+            self.open()
+        if self._writer is not None:
+            self._writer.flush()
+
+        plan = []
+        seq = self.head_seq + offset
+        end = min(seq + n, self.tail_seq)
+        for idx, segment in enumerate(self._segments):
+            if seq >= end:
+                break
+            segment_end = segment.first_seq + segment.count
+            if segment_end <= seq:
+                continue
+            count = min(segment_end, end) - seq
+            known = self._offsets.get(seq)
+            if known is not None and known[0] == segment.first_seq:
+                plan.append((segment.path, segment.first_seq, seq, known[1], 0, count))
+            elif idx == 0:
+                plan.append((segment.path, segment.first_seq, seq, self._head_offset, seq - self.head_seq, count))
+            else:
+                plan.append((segment.path, segment.first_seq, seq, 0, seq - segment.first_seq, count))
+            seq += count
+        return plan
+
+    @staticmethod
+    def read_records(plan):
+        """
+        This function reads the records of a read plan. It may run concurrently with appends and acknowledgements: if a
+        segment has been removed in the meantime, the records read so far are returned.
+        :param plan: read plan
+        :return: list of lines and list of tuples with sequence number, first sequence number of the segment and byte
+        offset of the record following each read one
+        """
+        data_lines = []
+        offsets = []
+        for path, first_seq, seq, position, skip, count in plan:
+            try:
+                with open(path, 'rb') as segment_file:
+                    segment_file.seek(position)
+                    for _ in range(skip):
+                        position += len(segment_file.readline())
+                    for i in range(count):
+                        line = segment_file.readline()
+                        position += len(line)
+                        data_lines.append(line[:-1].decode('utf-8'))
+                        offsets.append((seq + i + 1, first_seq, position))
+            except FileNotFoundError:
+                break
+        return data_lines, offsets
+
+    def remember_offsets(self, offsets):
+        """
+        This function remembers byte offsets of read records, so that acknowledging them does not require a disk read
+        :param offsets: offsets returned by read_records
+        :return:
+        """
+        if len(self._offsets) + len(offsets) > self.MAX_KNOWN_OFFSETS:
+            self._offsets.clear()
+        for seq, first_seq, position in offsets:
+            if seq > self.head_seq:
+                self._offsets[seq] = (first_seq, position)
+
+    def release(self, n):
+        """
+        This function acknowledges n oldest records. The new head is persisted and fully acknowledged segments are
+        removed by persist.
+        :param n: number of records
+        :return: number of acknowledged records
+        """
+        n = min(n, len(self))
+        if n and self._writer is not None:
+            self._writer.flush()
+        previous_head = self.head_seq
+        left = n
+        while left:
+            segment = self._segments[0]
+            records_left = segment.count - (self.head_seq - segment.first_seq)
+            if left >= records_left and segment is not self._segments[-1]:
+                self._drop_first_segment()
+                left -= records_left
+                continue
+            head_seq = self.head_seq + left
+            known = self._offsets.get(head_seq)
+            if known is not None and known[0] == segment.first_seq:
+                self._head_offset = known[1]
+            else:
+                # Records, which have not been read before, are skipped on the disk
+                with open(segment.path, 'rb') as segment_file:
+                    segment_file.seek(self._head_offset)
+                    for _ in range(left):
+                        self._head_offset += len(segment_file.readline())
+            self.head_seq = head_seq
+            left = 0
+        if n:
+            for seq in range(previous_head + 1, self.head_seq + 1):
+                self._offsets.pop(seq, None)
+            self._head_dirty = True
+        return n
+
+    def request_sync(self):
+        """
+        This function hands appended records over to the operating system and schedules the fsync of the active
+        segment, which is performed by persist
+        :return:
+        """
+        if self._writer is not None and self._pending_sync:
+            self._writer.flush()
+            # The descriptor is duplicated, so that it stays valid if the segment is closed before the fsync
+            self._sync_fds.append(os.dup(self._writer.fileno()))
+        self._pending_sync = 0
+        self._last_sync = time.monotonic()
+
+    def take_persist(self):
+        """
+        This function captures the segments to be fsync'd, the head and the segments to be removed since the last call
+        :return: state to be passed to persist, None if there is nothing to persist
+        """
+        if not self._head_dirty and not self._obsolete and not self._sync_fds:
+            return None
+        state = (self.head_seq if self._head_dirty else None, self._head_offset, self._obsolete, self._sync_fds)
+        self._head_dirty = False
+        self._obsolete = []
+        self._sync_fds = []
+        return state
+
+    def persist(self, state):
+        """
+        This function fsyncs appended records, writes the head file and removes obsolete segments afterwards. It may
+        run concurrently with other calls.
+        :param state: state returned by take_persist
+        :return:
+        """
+        if state is None:
+            return
+        head_seq, head_offset, obsolete, sync_fds = state
+        for fd in sync_fds:
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        with self._persist_lock:
+            if head_seq is not None and head_seq >= self._persisted_seq:
+                self._write_head(head_seq, head_offset)
+                self._persisted_seq = head_seq
+            for path in obsolete:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def sync(self):
+        """
+        This function flushes appended records to the disk immediately
+        :return:
+        """
+        if self._writer is not None:
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+        self._pending_sync = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        """
+        This function syncs and closes the active segment
+        :return:
+        """
+        if self._writer is not None:
+            self.sync()
+            self._writer.close()
+            self._writer = None
+        self.persist(self.take_persist())
+        self._opened = False
+
+    def _rotate(self):
+        """
+        This function closes the active segment and starts a new one
+        :return:
+        """
+        if self._writer is not None:
+            self.request_sync()
+            self._writer.close()
+        path = os.path.join(self.spool_dir, '%020d%s' % (self.tail_seq, self.SEGMENT_SUFFIX))
+        self._segments.append(_Segment(self.tail_seq, path))
+        self._writer = open(path, 'ab')
+        if len(self._segments) == 1:
+            self._head_offset = 0
+
+        # Compaction of segments, which have been acknowledged completely
+        while len(self._segments) > 1 and self.head_seq >= self._segments[0].first_seq + self._segments[0].count:
+            self._drop_first_segment()
+
+    def _drop_first_segment(self):
+        """
+        This function removes the oldest segment and moves the head to the beginning of the next one
+        :return: number of unacknowledged records, which were removed
+        """
+        segment = self._segments.pop(0)
+        dropped = segment.first_seq + segment.count - self.head_seq
+        self._obsolete.append(segment.path)
+        self.head_seq = segment.first_seq + segment.count
+        self._head_offset = 0
+        self._head_dirty = True
+        return dropped
+
+    def _enforce_max_size(self):
+        """
+        This function drops oldest segments as long as the spool exceeds its maximal size
+        :return: number of dropped records
+        """
+        dropped = 0
+        while len(self._segments) > 1 and self.size() > self.max_size:
+            dropped += self._drop_first_segment()
+        return dropped
+
+    def _read_head(self):
+        """
+        This function reads the sequence number and byte offset of the oldest unacknowledged record
+        :return:
+        """
+        try:
+            with open(os.path.join(self.spool_dir, self.HEAD_FILE)) as head_file:
+                head_seq, head_offset = head_file.read().split()
+                return int(head_seq), int(head_offset)
+        except (OSError, ValueError):
+            return 0, 0
+
+    def _write_head(self, head_seq, head_offset):
+        """
+        This function persists the position of the oldest unacknowledged record atomically
+        :param head_seq: sequence number of the oldest unacknowledged record
+        :param head_offset: byte offset of the record in its segment
+        :return:
+        """
+        path = os.path.join(self.spool_dir, self.HEAD_FILE)
+        with open(path + '.tmp', 'w') as head_file:
+            head_file.write(str(head_seq) + ' ' + str(head_offset) + '\n')
+            head_file.flush()
+            os.fsync(head_file.fileno())
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def _scan_segment(path):
+        """
+        This function counts complete records in a segment. A partially written trailing record is truncated.
+        :param path: path to the segment file
+        :return: number of records and size of the segment in bytes
+        """
+        with open(path, 'rb') as segment_file:
+            data = segment_file.read()
+        size = data.rfind(b'\n') + 1
+        if size != len(data):
+            with open(path, 'r+b') as segment_file:
+                segment_file.truncate(size)
+        return data.count(b'\n', 0, size), size
@@ -0,0 +1,24 @@
+import hashlib
+import json
+from types import MappingProxyType
+
+
+class StatusSnapshot:
+    """
+    Immutable status of the edge node: a read-only mapping of values together with its JSON body and an ETag, which
+    are computed once at creation. Snapshots are replaced as a whole, so that readers never see partial updates.
+    """
+
+    __slots__ = ('values', 'body', 'etag', 'timestamp')
+
+    def __init__(self, values, timestamp):
+        """
+        Initialisation
+        :param values: dict of status values
+        :param timestamp: creation time in s
+        """
+        self.values = MappingProxyType(dict(values))
+        self.body = json.dumps(self.values.copy())
+        # The ETag depends on the content only, so that unchanged snapshots are answered with 304
+        self.etag = hashlib.blake2s(self.body.encode('utf-8'), digest_size=8).hexdigest()
+        self.timestamp = timestamp
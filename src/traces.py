@@ -0,0 +1,101 @@
+"""
+Generation and replay of input traces. Traces are computed in bulk as NumPy arrays: generators take the array of time
+steps or a random generator, so that traces are reproducible and can be continued block by block.
+"""
+import os
+import numpy as np
+
+
+def constant(steps, value):
+    """
+    This function generates a constant trace
+    :param steps: array of time steps
+    :param value: constant value
+    :return: array of values
+    """
+    return np.full(len(steps), float(value))
+
+
+def ramp(n, start, slope, lower, upper):
+    """
+    This function generates a linear trace limited to a range
+    :param n: number of values
+    :param start: value before the first step
+    :param slope: change per step
+    :param lower: lower limit
+    :param upper: upper limit
+    :return: array of values
+    """
+    return np.clip(start + slope * np.arange(1, n + 1), lower, upper)
+
+
+def sine(steps, lower, upper):
+    """
+    This function generates a sine trace oscillating between the limits with a period of about 118 steps
+    :param steps: array of time steps
+    :param lower: lower limit
+    :param upper: upper limit
+    :return: array of values
+    """
+    return (lower + upper) / 2 + (upper - lower) / 2 * np.sin(steps / (2 * np.pi) / 3 - np.pi / 2)
+
+
+def critical_low(steps, lower, upper, high_steps=61, low_steps=31):
+    """
+    This function generates recurring critical-low episodes: the upper limit for high_steps, then the lower limit
+    for low_steps
+    :param steps: array of time steps
+    :param lower: lower limit
+    :param upper: upper limit
+    :param high_steps: duration of the normal phase in steps
+    :param low_steps: duration of the critical-low episode in steps
+    :return: array of values
+    """
+    return np.where(steps % (high_steps + low_steps) < high_steps, float(upper), float(lower))
+
+
+def random_uniform(rng, n, lower, upper):
+    """
+    This function generates uniformly distributed integer values
+    :param rng: NumPy random generator
+    :param n: number of values
+    :param lower: lower limit
+    :param upper: upper limit
+    :return: array of values
+    """
+    return rng.integers(lower, upper, size=n, endpoint=True).astype(float)
+
+
+def random_walk(rng, n, level, lower, upper, step_std=0.05, noise_std=0.1):
+    """
+    This function generates a random walk limited to a range with additive measurement noise
+    :param rng: NumPy random generator
+    :param n: number of values
+    :param level: level of the walk before the first step
+    :param lower: lower limit
+    :param upper: upper limit
+    :param step_std: standard deviation of the walk steps
+    :param noise_std: standard deviation of the measurement noise
+    :return: array of values and the level of the walk after the last step
+    """
+    levels = np.clip(level + np.cumsum(rng.normal(0, step_std, n)), lower, upper)
+    return levels + rng.normal(0, noise_std, n), float(levels[-1]) if n else level
+
+
+def load_trace(path, column=None):
+    """
+    This function loads a recorded trace as read-only memory map. CSV files (e.g. exported from INFLUXDB with a header
+    line) are converted once into a .npy file next to them.
+    :param path: path to a .npy or .csv file
+    :param column: CSV column, by default 'Value' if present or the last column
+    :return: array of values
+    """
+    if not path.endswith('.npy'):
+        cache_path = path + '.npy'
+        if not os.path.exists(cache_path) or os.path.getmtime(cache_path) < os.path.getmtime(path):
+            table = np.genfromtxt(path, delimiter=',', names=True, dtype=None, encoding='utf-8')
+            names = table.dtype.names
+            column = column or ('Value' if 'Value' in names else names[-1])
+            np.save(cache_path, np.atleast_1d(table[column]).astype(np.float64))
+        path = cache_path
+    return np.load(path, mmap_mode='r')
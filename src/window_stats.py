@@ -0,0 +1,137 @@
+import bisect
+import math
+import threading
+
+
+class WindowStatistics:
+    """
+    Statistics over the last samples of a signal kept in a fixed-size ring. Mean and variance are read in O(1) from a
+    running sum and sum of squares, the exponentially weighted moving average is updated per sample and the median is
+    read from a sorted copy of the window, which is maintained on insertion. All methods are thread-safe.
+    """
+
+    FILTERS = ('mean', 'ewma', 'median')
+
+    def __init__(self, size, filter='mean', ewma_alpha=0.2):
+        """
+        Initialisation
+        :param size: number of samples in the window
+        :param filter: statistic returned by value(): mean, ewma or median
+        :param ewma_alpha: smoothing factor of the exponentially weighted moving average (0..1]
+        """
+        if size < 1:
+            raise ValueError('Window size must be positive: ' + str(size))
+        if filter not in self.FILTERS:
+            raise ValueError('Unknown filter: ' + str(filter))
+        if not 0 < ewma_alpha <= 1:
+            raise ValueError('EWMA smoothing factor must be in (0, 1]: ' + str(ewma_alpha))
+        self.size = size
+        self.filter = filter
+        self.ewma_alpha = ewma_alpha
+
+        self._ring = [0.0] * size
+        self._sorted = []
+        self._count = 0
+        self._total = 0
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._ewma = None
+        self._lock = threading.Lock()
+
+    def add(self, value):
+        """
+        This function adds a sample and evicts the oldest one, if the window is full
+        :param value: sample
+        :return:
+        """
+        with self._lock:
+            index = self._total % self.size
+            if self._count == self.size:
+                oldest = self._ring[index]
+                self._sum -= oldest
+                self._sum_sq -= oldest * oldest
+                del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+            else:
+                self._count += 1
+            self._ring[index] = value
+            self._sum += value
+            self._sum_sq += value * value
+            bisect.insort(self._sorted, value)
+            self._ewma = value if self._ewma is None else self._ewma + self.ewma_alpha * (value - self._ewma)
+            self._total += 1
+
+            # Recompute the running sums once per window to bound the accumulated rounding error
+            if index == self.size - 1 and self._count == self.size:
+                self._sum = math.fsum(self._ring)
+                self._sum_sq = math.fsum(sample * sample for sample in self._ring)
+
+    def count(self):
+        """
+        This function returns the number of samples in the window
+        :return:
+        """
+        return self._count
+
+    def total(self):
+        """
+        This function returns the number of samples added since creation, e.g. to detect missing new samples
+        :return:
+        """
+        return self._total
+
+    def mean(self):
+        """
+        This function returns the mean of the window or None, if it is empty
+        :return:
+        """
+        with self._lock:
+            return self._sum / self._count if self._count else None
+
+    def variance(self):
+        """
+        This function returns the population variance of the window or None, if it is empty
+        :return:
+        """
+        with self._lock:
+            if not self._count:
+                return None
+            mean = self._sum / self._count
+            return max(self._sum_sq / self._count - mean * mean, 0.0)
+
+    def std(self):
+        """
+        This function returns the population standard deviation of the window or None, if it is empty
+        :return:
+        """
+        variance = self.variance()
+        return None if variance is None else math.sqrt(variance)
+
+    def ewma(self):
+        """
+        This function returns the exponentially weighted moving average or None, if no sample has been added
+        :return:
+        """
+        return self._ewma
+
+    def median(self):
+        """
+        This function returns the median of the window or None, if it is empty
+        :return:
+        """
+        with self._lock:
+            count = len(self._sorted)
+            if not count:
+                return None
+            middle = count // 2
+            return self._sorted[middle] if count % 2 else (self._sorted[middle - 1] + self._sorted[middle]) / 2
+
+    def value(self):
+        """
+        This function returns the configured statistic
+        :return:
+        """
+        if self.filter == 'ewma':
+            return self.ewma()
+        if self.filter == 'median':
+            return self.median()
+        return self.mean()
@@ -0,0 +1,132 @@
+import os
+import pytest
+from src.Buffer import Buffer
+from src.point import Point, registry
+
+EVENT_LOGGER_CFG = {'publish': False, 'print_level': 'ERR'}
+
+
+@pytest.fixture
+def voltage():
+    return registry.register('voltage', {'Unit': 'V'})
+
+
+@pytest.fixture
+def state():
+    return registry.register('state', {})
+
+
+def make_buffer(**buffer_cfg):
+    return Buffer({'buffer': dict({'max_size': 100}, **buffer_cfg), 'event_logger': EVENT_LOGGER_CFG})
+
+
+def values(buffer_entities):
+    return [buffer_entity.convert_to_line_protocol()[1].split(' ')[1] for buffer_entity in buffer_entities]
+
+
+def test_lane_eviction_policies(voltage, state):
+    buffer = make_buffer(lanes=[
+        {'name': 'events', 'measurements': ['state'], 'max_size': 3, 'eviction': 'drop_newest'},
+        {'name': 'telemetry', 'max_size': 3, 'eviction': 'drop_oldest'},
+    ])
+    for i in range(5):
+        buffer.append(Point(state, i, (i,)))
+        buffer.append(Point(voltage, i, (float(i),)))
+
+    assert buffer.get_lane_statistics() == {'events': {'size': 3, 'dropped': 2},
+                                            'telemetry': {'size': 3, 'dropped': 2}}
+    # Events keep the oldest points and are drained first, telemetry keeps the newest points
+    _, buffer_entities = buffer.peek_batch(10)
+    assert values(buffer_entities) == ['Value=0', 'Value=1', 'Value=2',
+                                       'Value=2.0', 'Value=3.0', 'Value=4.0']
+
+
+def test_unknown_eviction_policy():
+    with pytest.raises(ValueError):
+        make_buffer(lanes=[{'name': 'telemetry', 'eviction': 'drop_random'}])
+
+
+def test_commit_after_drop_oldest_overflow(voltage):
+    buffer = make_buffer(max_size=4)
+    for i in range(4):
+        buffer.append(Point(voltage, i, (float(i),)))
+    seq, buffer_entities = buffer.peek_batch(3)
+    assert values(buffer_entities) == ['Value=0.0', 'Value=1.0', 'Value=2.0']
+
+    # Two of the peeked points are evicted before the batch is committed
+    buffer.append(Point(voltage, 4, (4.0,)))
+    buffer.append(Point(voltage, 5, (5.0,)))
+    assert buffer.commit(3, seq) == 1
+
+    # Points appended after the peek are not removed
+    assert values(buffer.peek_batch(10)[1]) == ['Value=3.0', 'Value=4.0', 'Value=5.0']
+
+
+def test_reclaim_after_all_consumers_committed(voltage):
+    buffer = make_buffer()
+    for i in range(5):
+        buffer.append(Point(voltage, i, (float(i),)))
+    primary = buffer.register_consumer('primary')
+    mirror = buffer.register_consumer('mirror')
+
+    seq, buffer_entities = buffer.peek_batch(10, primary)
+    assert buffer.commit(len(buffer_entities), seq, primary) == 0
+    assert buffer.len(primary) == 0
+    assert buffer.len(mirror) == 5
+    assert buffer.len() == 5
+
+    seq, buffer_entities = buffer.peek_batch(3, mirror)
+    assert buffer.commit(len(buffer_entities), seq, mirror) == 3
+    assert buffer.len() == 2
+    assert values(buffer.peek_batch(10, mirror)[1]) == ['Value=3.0', 'Value=4.0']
+
+    # Removals bypassing the cursors are rejected, unregistering releases the points retained for the consumer
+    with pytest.raises(ValueError):
+        buffer.commit(1)
+    with pytest.raises(ValueError):
+        buffer.remove_points([0])
+    buffer.unregister_consumer(mirror)
+    assert buffer.len() == 0
+
+
+def test_spool_head_recovery_after_truncated_segment(voltage, tmp_path):
+    spool_dir = str(tmp_path)
+    buffer = make_buffer(spool_dir=spool_dir)
+    buffer.restore()
+    for i in range(6):
+        buffer.append(Point(voltage, i, (float(i),)))
+    seq, buffer_entities = buffer.peek_batch(2)
+    buffer.commit(len(buffer_entities), seq)
+    buffer.close()
+
+    # Crash while a record was being written
+    segment_files = sorted(file_name for file_name in os.listdir(spool_dir) if file_name.endswith('.seg'))
+    with open(os.path.join(spool_dir, segment_files[-1]), 'ab') as segment_file:
+        segment_file.write(b'voltage,Unit=V Value=6.')
+
+    buffer = make_buffer(spool_dir=spool_dir)
+    assert buffer.restore() == 4
+    buffer.append(Point(voltage, 7, (7.0,)))
+    seq, buffer_entities = buffer.peek_batch(10)
+    assert values(buffer_entities) == ['Value=2.0', 'Value=3.0', 'Value=4.0', 'Value=5.0', 'Value=7.0']
+    buffer.commit(3, seq)
+    buffer.close()
+
+    buffer = make_buffer(spool_dir=spool_dir)
+    assert buffer.restore() == 2
+    assert values(buffer.peek_batch(10)[1]) == ['Value=5.0', 'Value=7.0']
+    buffer.close()
+
+
+def test_spool_fsync_outside_buffer_lock(voltage, tmp_path, monkeypatch):
+    buffer = make_buffer(spool_dir=str(tmp_path), spool_fsync_every=2)
+    buffer.restore()
+    lock_held = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, 'fsync', lambda fd: lock_held.append(buffer._lock.locked()) or fsync(fd))
+    for i in range(4):
+        buffer.append(Point(voltage, i, (float(i),)))
+
+    # Appended records are fsync'd in groups after the lock is released
+    assert lock_held == [False, False]
+    buffer.close()
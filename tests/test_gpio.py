@@ -0,0 +1,29 @@
+from src.gpio_reader_writer import GPIODataReaderWriter
+from src.hal import SimulatedBackend
+
+CFG = {
+    'simulation': {'profile': 'random_walk', 'initial_value': 50, 'seed': 1},
+    'event_logger': {'publish': False, 'print_level': 'ERR'},
+}
+
+
+def scan_count(gpio_interface):
+    return [value for suffix, _, value in gpio_interface.i2c_read_duration.samples() if suffix == '_count'][0]
+
+
+def test_read_scan_reads_each_channel_once():
+    backend = SimulatedBackend(CFG)
+    gpio_interface = GPIODataReaderWriter(CFG, backend=backend)
+    voltage = {'channel': 0, 'scale_min': 40, 'scale_max': 60}
+    current = {'channel': 1, 'scale_min': 0, 'scale_max': 10}
+    scans = scan_count(gpio_interface)
+
+    values = gpio_interface.read_scan([voltage, current, voltage])
+
+    # Inputs of the same channel share a single read, every channel has its own simulator advanced by one step
+    assert len(values) == 3
+    assert values[0] == values[2]
+    assert sorted(backend.simulators) == [0, 1]
+    assert all(simulator.time_step == 1 for simulator in backend.simulators.values())
+    # One observation of the read duration per scan
+    assert scan_count(gpio_interface) == scans + 1